@@ -1,7 +1,25 @@
 '''
+Axis-aligned bounding boxes, plus an STR-packed R-tree (BoxIndex) for querying
+large collections of them.
+
+BoxArray stores many boxes as a struct-of-arrays, for hot paths where one
+object per box is too expensive.
+
+Boxes have y increasing upwards: top >= bottom, right >= left.
 '''
+import heapq
+import math
+from array import array
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 
 class BoundingBox:
+    __slots__ = ('top', 'left', 'bottom', 'right')
+
     def __init__(self, top, left, bottom, right):
         self.top = top
         self.bottom = bottom
@@ -20,17 +38,12 @@ class BoundingBox:
         '''
         pts: list of tuples (x,y)
         '''
-        max_top = pts[0][1]
-        min_left = pts[0][0]
-        min_bottom = pts[0][1]
-        max_right = pts[0][0]
+        xs = [pt[0] for pt in pts]
+        ys = [pt[1] for pt in pts]
+        return cls(max(ys), min(xs), min(ys), max(xs))
 
-        for pt in pts:
-            max_top = max(max_top, pt[0])
-            min_left = min(min_left, pt[0])
-            min_bottom = min(min_bottom, pt[0])
-            max_right = max(max_right, pt[0])
-        return cls(max_top, min_left, min_bottom, max_right)
+    def __repr__(self):
+        return F"BoundingBox({self.top}, {self.left}, {self.bottom}, {self.right})"
 
     @property
     def area(self):
@@ -51,7 +64,240 @@ class BoundingBox:
         min_bottom = min(self.bottom, other.bottom)
         max_right = max(self.right, other.right)
         return BoundingBox(max_top, min_left, min_bottom, max_right)
-    
+
+    def intersects(self, other):
+        ''' like intersection() without building a new box; touching boxes intersect '''
+        return not (self.top < other.bottom or self.bottom > other.top or
+                    self.right < other.left or self.left > other.right)
+
+    def distance(self, x, y):
+        ''' euclidean distance from point (x, y) to the box; 0 if inside '''
+        dx = max(self.left - x, 0, x - self.right)
+        dy = max(self.bottom - y, 0, y - self.top)
+        return math.hypot(dx, dy)
+
+
+class _Node:
+    ''' R-tree node: a bounding box plus either child nodes or (for leaves) item indices '''
+    __slots__ = ('top', 'left', 'bottom', 'right', 'children', 'leaf')
+
+    def __init__(self, children, boxes, leaf):
+        self.children = children
+        self.leaf = leaf
+        self.top = max(b.top for b in boxes)
+        self.left = min(b.left for b in boxes)
+        self.bottom = min(b.bottom for b in boxes)
+        self.right = max(b.right for b in boxes)
+
+    intersects = BoundingBox.intersects
+    distance = BoundingBox.distance
+
+
+class BoxIndex:
+    '''
+    Static R-tree over a list of BoundingBox objects, bulk-loaded with
+    Sort-Tile-Recursive packing.
+
+    Queries return indices into the list the index was built from; use index.boxes[i]
+    to get the box itself.
+    '''
+    def __init__(self, boxes, node_capacity=16):
+        if node_capacity < 2:
+            raise ValueError(F"node_capacity must be at least 2 (got {node_capacity})")
+        self.boxes = list(boxes)
+        self.node_capacity = node_capacity
+        self.root = None
+        if self.boxes:
+            nodes = self._pack(list(range(len(self.boxes))), self.boxes, leaf=True)
+            while len(nodes) > 1:
+                nodes = self._pack(nodes, nodes, leaf=False)
+            self.root = nodes[0]
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _pack(self, entries, boxes, leaf):
+        ''' group entries (with parallel boxes) into nodes of at most node_capacity entries '''
+        cap = self.node_capacity
+        order = sorted(range(len(entries)), key=lambda i: boxes[i].left + boxes[i].right)
+        n_slices = math.ceil(math.sqrt(math.ceil(len(entries) / cap)))
+        slice_size = n_slices * cap
+
+        nodes = []
+        for s in range(0, len(order), slice_size):
+            vslice = sorted(order[s:s + slice_size], key=lambda i: boxes[i].bottom + boxes[i].top)
+            for c in range(0, len(vslice), cap):
+                group = vslice[c:c + cap]
+                nodes.append(_Node([entries[i] for i in group], [boxes[i] for i in group], leaf))
+        return nodes
+
+    def query(self, window):
+        ''' return the indices of all boxes intersecting window '''
+        answer = []
+        if self.root is None:
+            return answer
+        stack = [self.root]
+        boxes = self.boxes
+        while stack:
+            node = stack.pop()
+            if not node.intersects(window):
+                continue
+            if node.leaf:
+                answer.extend(i for i in node.children if boxes[i].intersects(window))
+            else:
+                stack.extend(node.children)
+        return answer
+
+    def nearest(self, x, y, k=1):
+        '''
+        return a list of up to k (distance, index) tuples for the boxes closest to point (x, y),
+        nearest first.
+        '''
+        answer = []
+        if self.root is None or k <= 0:
+            return answer
+        # best-first search; is_item distinguishes box indices from nodes and breaks ties:
+        heap = [(self.root.distance(x, y), 1, 0, self.root)]
+        counter = 1
+        while heap and len(answer) < k:
+            dist, is_node, _, entry = heapq.heappop(heap)
+            if not is_node:
+                answer.append((dist, entry))
+                continue
+            for child in entry.children:
+                counter += 1
+                if entry.leaf:
+                    heapq.heappush(heap, (self.boxes[child].distance(x, y), 0, counter, child))
+                else:
+                    heapq.heappush(heap, (child.distance(x, y), 1, counter, child))
+        return answer
+
+    def join(self, other):
+        '''
+        yield (i, j) for every pair where self.boxes[i] intersects other.boxes[j].
+        other: a BoxIndex; both trees are traversed together.
+        '''
+        if self.root is None or other.root is None:
+            return
+        stack = [(self.root, other.root)]
+        while stack:
+            a, b = stack.pop()
+            if not a.intersects(b):
+                continue
+            if a.leaf and b.leaf:
+                for i in a.children:
+                    box = self.boxes[i]
+                    if not box.intersects(b):
+                        continue
+                    for j in b.children:
+                        if box.intersects(other.boxes[j]):
+                            yield i, j
+            elif a.leaf or (not b.leaf and len(b.children) >= len(a.children)):
+                stack.extend((a, child) for child in b.children)
+            else:
+                stack.extend((child, b) for child in a.children)
+
+
+class BoxArray:
+    '''
+    N boxes stored as four parallel arrays of doubles (top, left, bottom, right).
+    Indexing returns a BoundingBox built on the fly.
+    '''
+    __slots__ = ('top', 'left', 'bottom', 'right')
+
+    def __init__(self, top=(), left=(), bottom=(), right=()):
+        self.top = array('d', top)
+        self.left = array('d', left)
+        self.bottom = array('d', bottom)
+        self.right = array('d', right)
+        if not len(self.top) == len(self.left) == len(self.bottom) == len(self.right):
+            raise ValueError("top, left, bottom and right must all have the same length")
+
+    @classmethod
+    def from_boxes(cls, boxes):
+        box_array = cls()
+        for box in boxes:
+            box_array.append(box)
+        return box_array
+
+    @classmethod
+    def from_points(cls, groups):
+        '''
+        groups: list of point lists, each a non-empty list of (x, y) tuples.
+        Return a BoxArray with one bounding box per group.
+        '''
+        if not HAS_NUMPY:
+            return cls.from_boxes(BoundingBox.from_list(pts) for pts in groups)
+
+        lengths = np.fromiter((len(pts) for pts in groups), dtype=np.intp, count=len(groups))
+        if not len(lengths):
+            return cls()
+        if not lengths.all():
+            raise ValueError("empty point group")
+        pts = np.concatenate([np.asarray(p, dtype=float).reshape(-1, 2) for p in groups])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        xs, ys = pts[:, 0], pts[:, 1]
+        return cls(np.maximum.reduceat(ys, offsets), np.minimum.reduceat(xs, offsets),
+                   np.minimum.reduceat(ys, offsets), np.maximum.reduceat(xs, offsets))
+
+    def __len__(self):
+        return len(self.top)
+
+    def __getitem__(self, i):
+        return BoundingBox(self.top[i], self.left[i], self.bottom[i], self.right[i])
+
+    def __iter__(self):
+        for t, l, b, r in zip(self.top, self.left, self.bottom, self.right):
+            yield BoundingBox(t, l, b, r)
+
+    def append(self, box):
+        self.top.append(box.top)
+        self.left.append(box.left)
+        self.bottom.append(box.bottom)
+        self.right.append(box.right)
+
+    def areas(self):
+        ''' return the area of every box: a numpy array if numpy is installed, else a list '''
+        if HAS_NUMPY:
+            return areas(self.to_array())
+        return [abs((r - l) * (t - b)) for t, l, b, r in zip(self.top, self.left, self.bottom, self.right)]
+
+    def to_array(self):
+        ''' return a numpy array of shape (N, 4) for use with areas() and intersections() '''
+        if not HAS_NUMPY:
+            raise RuntimeError("numpy not installed")
+        return np.stack([np.frombuffer(col, dtype=float)
+                         for col in (self.top, self.left, self.bottom, self.right)], axis=-1)
+
+
+def to_array(boxes):
+    ''' convert a list of boxes to a numpy array of shape (N, 4): top, left, bottom, right '''
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy not installed")
+    return np.array([(b.top, b.left, b.bottom, b.right) for b in boxes], dtype=float).reshape(-1, 4)
+
+
+def areas(arr):
+    ''' arr: numpy array of shape (N, 4) as returned by to_array(); return array of N areas '''
+    return np.abs((arr[:, 3] - arr[:, 1]) * (arr[:, 0] - arr[:, 2]))
+
+
+def intersections(arr1, arr2):
+    '''
+    Element-wise intersection of two (N, 4) arrays (or one (N, 4) and one (4,) box).
+    Returns (boxes, mask): boxes is (N, 4), mask is True where the boxes intersect;
+    rows where mask is False hold NaN.
+    '''
+    top = np.minimum(arr1[..., 0], arr2[..., 0])
+    left = np.maximum(arr1[..., 1], arr2[..., 1])
+    bottom = np.maximum(arr1[..., 2], arr2[..., 2])
+    right = np.minimum(arr1[..., 3], arr2[..., 3])
+    mask = (top >= bottom) & (left <= right)
+    boxes = np.stack([top, left, bottom, right], axis=-1).astype(float)
+    boxes[~mask] = np.nan
+    return boxes, mask
+
+
 if __name__ == '__main__':
     bb1 = BoundingBox(10, 0, 0, 10)
     bb2 = BoundingBox(5, -5, -5, 5)
@@ -0,0 +1,160 @@
+'''
+A persistent (sqlite) index of file stat data and content hashes, for finding
+which files under a folder changed since the last run.
+
+Content hashes are only computed (streamed, in parallel) for files whose size,
+mtime or inode differ from what the index recorded.
+'''
+import os
+import sqlite3
+import hashlib
+from collections import namedtuple, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+create_sql = '''
+CREATE TABLE IF NOT EXISTS files (
+path TEXT PRIMARY KEY,
+size INTEGER,
+mtime_ns INTEGER,
+inode INTEGER,
+digest TEXT
+)
+'''
+
+FileRecord = namedtuple('FileRecord', ['path', 'size', 'mtime_ns', 'inode', 'digest'])
+FileChange = namedtuple('FileChange', ['path', 'status', 'digest'])  # status: 'added', 'modified' or 'deleted'
+
+
+class FileIndex:
+    ''' The stored state of a set of files, keyed by absolute path. '''
+    def __init__(self, db_path, algorithm='sha1'):
+        self.db_path = db_path
+        self.algorithm = algorithm
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(create_sql)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get(self, path):
+        ''' return the FileRecord for path, or None '''
+        row = self.conn.execute('SELECT path, size, mtime_ns, inode, digest FROM files WHERE path=?',
+                                (os.path.abspath(path),)).fetchone()
+        return FileRecord(*row) if row else None
+
+    def records_under(self, root):
+        ''' return a dict: k=path, v=FileRecord for every indexed file under root '''
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, '')
+        sql = 'SELECT path, size, mtime_ns, inode, digest FROM files WHERE path=? OR substr(path, 1, ?)=?'
+        return {row[0]: FileRecord(*row) for row in self.conn.execute(sql, (root, len(prefix), prefix))}
+
+    def save(self, record):
+        self.conn.execute('INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?)',
+                          record)
+
+    def remove(self, path):
+        self.conn.execute('DELETE FROM files WHERE path=?', (path,))
+
+
+def hash_file(path, algorithm='sha1', chunk_size=1 << 20):
+    ''' return the hex digest of a file's contents, read in chunks '''
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _walk_files(root):
+    ''' yield (path, stat_result) for every regular file under root; symlinks are not followed '''
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry.path, entry.stat(follow_symlinks=False)
+                    except OSError:
+                        pass    # vanished or unreadable
+        except OSError:
+            pass
+
+
+def changed_since(index, root, n_threads=4, commit_every=10000):
+    '''
+    Yield a FileChange for every file under root that was added, modified or deleted
+    since the index last saw it, updating the index as it goes.
+
+    index: a FileIndex, or the path of its db file.
+    A file whose stat data changed but whose content hash didn't (eg, touched) is
+    recorded silently.
+    '''
+    if not isinstance(index, FileIndex):
+        with FileIndex(index) as file_index:
+            yield from changed_since(file_index, root, n_threads=n_threads, commit_every=commit_every)
+        return
+
+    root = os.path.abspath(root)
+    known = index.records_under(root)
+
+    candidates = []             # (FileRecord with no digest, previous FileRecord or None)
+    for path, st in _walk_files(root):
+        prev = known.pop(path, None)
+        if prev is not None and (prev.size, prev.mtime_ns, prev.inode) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            continue
+        candidates.append((FileRecord(path, st.st_size, st.st_mtime_ns, st.st_ino, None), prev))
+
+    def _hash(candidate):
+        record, _ = candidate
+        try:
+            return hash_file(record.path, index.algorithm)
+        except OSError:
+            return None         # vanished since the walk
+
+    n_saved = 0
+    window = max(1, n_threads * 4)      # hashes in flight
+    pool = ThreadPoolExecutor(max_workers=n_threads)
+    pending = deque()                   # (FileRecord, previous FileRecord or None, future of digest)
+    try:
+        todo = iter(candidates)
+        while True:
+            for record, prev in islice(todo, window - len(pending)):
+                pending.append((record, prev, pool.submit(_hash, (record, prev))))
+            if not pending:
+                break
+            record, prev, future = pending.popleft()
+            digest = future.result()
+            if digest is None:
+                if prev is not None:
+                    known[record.path] = prev   # report as deleted below
+                continue
+            index.save(record._replace(digest=digest))
+            n_saved += 1
+            if n_saved % commit_every == 0:
+                index.conn.commit()
+            if prev is None:
+                yield FileChange(record.path, 'added', digest)
+            elif prev.digest != digest:
+                yield FileChange(record.path, 'modified', digest)
+
+        for path in sorted(known):
+            index.remove(path)
+            yield FileChange(path, 'deleted', None)
+    finally:
+        for _, _, future in pending:    # eg the caller stopped iterating (GeneratorExit)
+            future.cancel()
+        pool.shutdown(wait=True)
+        index.conn.commit()
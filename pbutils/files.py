@@ -1,12 +1,26 @@
 import os
 import time
 import errno
-from collections import OrderedDict
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pkg_resources as pr
 from future.utils import iteritems
 
+log = logging.getLogger(__name__)
+
 def get_size(path, units='auto'):
     ''' Return a user-friendly, auto-scaled string representation of the size of a file. '''
+    raw_size = os.stat(path).st_size
+    if units.lower() == 'raw':
+        return raw_size
+    return format_size(raw_size, units)
+
+def format_size(raw_size, units='auto'):
+    ''' Return a user-friendly string representation of raw_size bytes; see get_size() for units. '''
     divisors = OrderedDict()
     divisors['bytes']=1
     divisors['kb']=1<<10
@@ -16,9 +30,6 @@ def get_size(path, units='auto'):
     divisors['pb']=1<<50
     
     units = units.lower()
-    raw_size = os.stat(path).st_size
-    if units == 'raw':
-        return raw_size
     try:
         # try to return answer in requested units
         divisor = divisors[units]
@@ -32,6 +43,73 @@ def get_size(path, units='auto'):
             
     return '{}{}'.format(size, units.capitalize())
 
+DirUsage = namedtuple('DirUsage', ['mtime', 'own_size', 'n_files', 'subdirs', 'total_size'])
+
+def scan_sizes(root, n_threads=8, previous=None):
+    '''
+    Compute disk usage for every directory under root (inclusive), scanning directories in parallel.
+
+    Returns a dict: k=directory path, v=DirUsage, where own_size and n_files cover the files directly
+    in the directory and total_size also includes all subdirectories.  Symlinks are not followed or counted.
+
+    previous: the result of an earlier scan_sizes(); directories whose mtime hasn't changed reuse their
+    previous file totals instead of being re-listed.  A directory's mtime only changes when entries are
+    added, removed or renamed, so files modified in place are not noticed by an incremental rescan.
+    '''
+    previous = previous or {}
+    scanned = {}
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        pending = {pool.submit(_scan_dir, root, previous)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, usage = future.result()
+                scanned[path] = usage
+                pending.update(pool.submit(_scan_dir, subdir, previous) for subdir in usage.subdirs)
+
+    # aggregate totals bottom-up:
+    totals = {}
+    for path in sorted(scanned, key=lambda p: p.count(os.sep), reverse=True):
+        usage = scanned[path]
+        total = usage.own_size + sum(totals[subdir] for subdir in usage.subdirs if subdir in totals)
+        totals[path] = total
+        scanned[path] = usage._replace(total_size=total)
+    return scanned
+
+def _scan_dir(path, previous):
+    ''' list a single directory; returns (path, DirUsage) with total_size unset '''
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return path, DirUsage(None, 0, 0, (), 0)
+
+    prev = previous.get(path)
+    if prev is not None and prev.mtime == mtime:
+        return path, prev._replace(total_size=None)
+
+    own_size = 0
+    n_files = 0
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        own_size += entry.stat(follow_symlinks=False).st_size
+                        n_files += 1
+                except OSError:
+                    pass        # vanished or unreadable; skip it
+    except OSError:
+        pass                    # permission denied, etc
+    return path, DirUsage(mtime, own_size, n_files, tuple(subdirs), None)
+
+def size_report(usages, units='auto'):
+    ''' yield (path, formatted total size) for each directory in a scan_sizes() result, sorted by path '''
+    for path in sorted(usages):
+        yield path, format_size(usages[path].total_size, units)
+
 def get_timestamp(path):
     ''' return the file modification time '''
     ts = os.path.getmtime(path)
@@ -64,6 +142,195 @@ def truncate(fn):
     with open(fn, 'w') as f:
         pass
 
+_umask = None
+_umask_lock = threading.Lock()
+
+def _get_umask():
+    '''
+    the process's umask, so temp files can be given normal permissions; read once, on first use.
+    From /proc/self/status where it's shown (Linux); otherwise set it to 0 and restore it, under a lock.
+    '''
+    global _umask
+    if _umask is None:
+        with _umask_lock:
+            if _umask is None:
+                _umask = _read_proc_umask()
+            if _umask is None:
+                _umask = os.umask(0)
+                os.umask(_umask)
+    return _umask
+
+def _read_proc_umask():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _mkstemp(path):
+    ''' create a temp file next to path; return (fd, tmp_path) '''
+    folder, base = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.{}.'.format(base), suffix='.tmp')
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = 0o666 & ~_get_umask()
+    os.chmod(tmp_path, mode)
+    return fd, tmp_path
+
+def _fsync_folder(folder):
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_open(path, mode='w', fsync=False):
+    '''
+    Like open(path, mode), but writes go to a temp file in the same folder that replaces path
+    (via os.replace) only when the block exits without an exception.  Readers never see a partial file.
+    '''
+    fd, tmp_path = _mkstemp(path)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    if fsync:
+        _fsync_folder(os.path.dirname(os.path.abspath(path)))
+
+def atomic_write(path, data, fsync=False):
+    ''' atomically replace the contents of path with data (str or bytes) '''
+    with atomic_open(path, 'wb' if isinstance(data, bytes) else 'w', fsync=fsync) as f:
+        f.write(data)
+
+class AtomicWriter:
+    '''
+    Atomically write many files, batching the fsyncs.
+
+    Without fsync, each write() is just atomic_write().  With fsync, finished temp files are
+    held until batch_size of them are pending (or flush()/close() is called); they are then
+    fsync'ed, renamed into place, and each affected folder is fsync'ed once per batch.
+    Until then the target paths still hold their old contents.
+    '''
+    def __init__(self, fsync=False, batch_size=64):
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.pending = []       # list of (tmp_path, path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, path, data):
+        if not self.fsync:
+            atomic_write(path, data)
+            return
+
+        fd, tmp_path = _mkstemp(path)
+        try:
+            with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+                f.write(data)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.pending.append((tmp_path, path))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        ''' fsync and rename all pending files '''
+        pending, self.pending = self.pending, []
+        for tmp_path, _ in pending:
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        folders = set()
+        for tmp_path, path in pending:
+            os.replace(tmp_path, path)
+            folders.add(os.path.dirname(os.path.abspath(path)))
+        for folder in folders:
+            _fsync_folder(folder)
+
+    def discard(self):
+        ''' remove all pending temp files without renaming them '''
+        pending, self.pending = self.pending, []
+        for tmp_path, _ in pending:
+            os.unlink(tmp_path)
+
+    def close(self):
+        self.flush()
+
+class BulkWriter:
+    '''
+    Write many (small) files on a background thread pool, each one atomically.
+
+    write() returns as soon as the file is queued; it blocks while max_pending writes are
+    outstanding.  close() waits for all writes and raises the first error encountered
+    (leaving a with block on an exception, write errors are logged instead, so that one propagates).
+    '''
+    def __init__(self, n_threads=4, max_pending=256, fsync=False):
+        self.fsync = fsync
+        self.pool = ThreadPoolExecutor(max_workers=n_threads)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.errors = []
+        self.n_written = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except IOError as e:
+            log.error(F"while handling {exc_type.__name__}: {e}")
+
+    def write(self, path, data):
+        self.slots.acquire()
+        try:
+            self.pool.submit(self._write, path, data)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _write(self, path, data):
+        try:
+            atomic_write(path, data, fsync=self.fsync)
+            with self._lock:
+                self.n_written += 1
+        except Exception as e:
+            with self._lock:
+                self.errors.append((path, e))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.errors:
+            path, e = self.errors[0]
+            raise IOError('{} of {} writes failed; {}: {}'.format(
+                len(self.errors), len(self.errors) + self.n_written, path, e)) from e
+
 if __name__=='__main__':
     path = '/usr/local/everest/data/var/UserData/Victor/Reads/LB5025/LB5025germline_PG0-718_LB4852V_rename.fastq'
     # for units in 'auto bytes kb mb gb pb'.split(' '):
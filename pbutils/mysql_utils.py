@@ -1,7 +1,15 @@
 import sys
 import os
 import copy
+import time
+import tempfile
 import datetime
+import json
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
 from contextlib import contextmanager
 import sqlalchemy as sa
 import multiprocessing as mp
@@ -17,18 +25,30 @@ if PYTHON2:
 elif PYTHON3:
     from hashlib import md5
     import pymysql as mysql
-    from pymysql.err import OperationalError
+    import pymysql.cursors
+    from pymysql.err import OperationalError, Error as _MysqlError
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 from .dicts import hashsubset, to_dict
 from .strings import ppjson, qw
 from .configs import get_config
+from .files import atomic_write
+from . import sql_timing
 
-def get_mysql(host, database, user, password):
-    ''' Connect to a mysql database. '''
+def get_mysql(host, database, user, password, **connect_args):
+    '''
+    Connect to a mysql database.
+    connect_args are passed to the driver, eg local_infile=True (needed for bulk_load()).
+    '''
     if PYTHON2:
-        return mysql.connector.connect(host=host, database=database, user=user, password=password)
+        return mysql.connector.connect(host=host, database=database, user=user, password=password, **connect_args)
     elif PYTHON3:
-        return mysql.connect(host=host, database=database, user=user, password=password)
+        return mysql.connect(host=host, database=database, user=user, password=password, **connect_args)
 
 def get_mysql_from_config(config, section):
     mysql_args = hashsubset(to_dict(config, section), 'host', 'database', 'user', 'password')
@@ -69,11 +89,70 @@ def get_database(dbh):
         return dbh.db.decode()
     
 
-def get_tables(dbh, db_name=None):
+def get_host(dbh):
+    ''' return the host name of the server we're connected to '''
+    if PYTHON2:
+        return dbh.server_host
+    elif PYTHON3:
+        return dbh.host
+
+
+class SchemaCache:
+    '''
+    Cache of table lists and field info, keyed by (host, database, tablename)
+    (tablename is None for a database's table list).
+
+    Call invalidate() after DDL (CREATE/ALTER/DROP) so later lookups see the change.
+    '''
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key]
+        value = loader()
+        with self.lock:
+            self.entries[key] = value
+        return value
+
+    def invalidate(self, host=None, database=None, tablename=None):
+        '''
+        Drop matching entries; None matches anything.  Invalidating a table also drops its
+        database's table list.
+        '''
+        with self.lock:
+            for key in list(self.entries):
+                k_host, k_db, k_table = key
+                if host is not None and k_host != host:
+                    continue
+                if database is not None and k_db != database:
+                    continue
+                if tablename is not None and k_table not in (tablename, None):
+                    continue
+                del self.entries[key]
+
+
+schema_cache = SchemaCache()
+
+
+def invalidate_schema(dbh, tablename=None, db_name=None):
+    ''' drop cached schema info for a table (or, if tablename is None, a whole database) '''
+    if db_name is None:
+        db_name = get_database(dbh)
+    schema_cache.invalidate(get_host(dbh), db_name, tablename)
+
+
+def get_tables(dbh, db_name=None, use_cache=True):
     ''' return a list of tablenames for a given database '''
     if db_name is None:
         db_name = get_database(dbh)
+    if not use_cache:
+        return _get_tables(dbh, db_name)
+    return list(schema_cache.get((get_host(dbh), db_name, None), lambda: _get_tables(dbh, db_name)))
 
+def _get_tables(dbh, db_name):
     with get_cursor(dbh, buffered=True) as cursor:
         # we can't use mysql string interpolation to ensure db_name isn't something nasty,
         # so we check it against the list of existing databases:
@@ -87,13 +166,23 @@ def get_tables(dbh, db_name=None):
         cursor.execute(sql)
         return [t[0] for t in cursor]
 
-def get_field_info(dbh, tablename):
+def get_field_info(dbh, tablename, use_cache=True):
     '''
     Returns:
     - obj_fields gets a list of the columns in the table
     - column_info get a dict keyed on column name; holds col_type, null_ok, key, default, extra, an py_type
     - primary_key gets the name of the primary key of the table (fixme: support for multiple-column primary keys?)
+
+    Results (including the py_type mapping) are computed once per table and cached in schema_cache.
     '''
+    if not use_cache:
+        return _get_field_info(dbh, tablename)
+    key = (get_host(dbh), get_database(dbh), tablename)
+    obj_fields, column_info, primary_key = schema_cache.get(key, lambda: _get_field_info(dbh, tablename))
+    # copies, so callers can't corrupt the cache:
+    return list(obj_fields), {col: dict(info) for col, info in column_info.items()}, primary_key
+
+def _get_field_info(dbh, tablename):
     # get all the field names from the table:
 
     with get_cursor(dbh) as cursor:
@@ -121,6 +210,7 @@ def get_field_info(dbh, tablename):
         obj_fields.sort()
         return obj_fields, column_info, primary_key
 
+@lru_cache(maxsize=None)
 def mysql_t2t(mytype):
     ''' take a mysql type as returned by "show columns from <tablename>" and return a python type '''
     mytype = mytype.lower()
@@ -148,19 +238,30 @@ def _get_cursor(dbh, **cursor_args):
     if PYTHON2:
         return dbh.cursor(**cursor_args)
     elif PYTHON3:
-        return dbh.cursor()
+        # translate mysql.connector-style args to a pymysql cursor class:
+        buffered = cursor_args.pop('buffered', True)
+        dictionary = cursor_args.pop('dictionary', False)
+        if 'cursor' not in cursor_args:
+            if buffered:
+                cursor_args['cursor'] = pymysql.cursors.DictCursor if dictionary else pymysql.cursors.Cursor
+            else:
+                cursor_args['cursor'] = pymysql.cursors.SSDictCursor if dictionary else pymysql.cursors.SSCursor
+        return dbh.cursor(**cursor_args)
         
 @contextmanager
 def get_cursor(dbh, **cursor_args):
     # if type(dbh) is not mysql.connector.connection.MySQLConnection:
     #     raise TypeError(dbh)
     try:
+        t0 = time.perf_counter()
         try:
             cursor = _get_cursor(dbh, **cursor_args)
         except OperationalError as e:
             # reconnect and try again
             dbh.reconnect()
-            cursor = dbh.cursor(**cursor_args)
+            cursor = _get_cursor(dbh, **cursor_args)
+        if sql_timing.hooks:
+            sql_timing.wait('cursor', time.perf_counter() - t0)
         yield cursor
 
     except Exception as e:
@@ -170,11 +271,67 @@ def get_cursor(dbh, **cursor_args):
         dbh.commit()
 
 
+def stream_query(dbh, sql, values=tuple(), batch_size=1000, row_type='tuple'):
+    '''
+    Run a query with an unbuffered (server-side) cursor and yield its results without
+    loading the whole result set into memory.  Rows are fetched batch_size at a time.
+
+    dbh: a connection or a MySQLPool (an exclusive connection is checked out for the life of the
+    generator, so the pool can be used for other statements while iterating).
+    row_type:
+    - 'tuple', 'dict', 'namedtuple': yield one row at a time in that form
+    - 'columns': yield one dict per batch, k=column name, v=numpy array (or list without numpy)
+
+    Closing the generator early (or garbage-collecting it) releases the connection; the
+    server still has to send (and the client discard) the rest of the result first.
+    '''
+    if row_type not in ('tuple', 'dict', 'namedtuple', 'columns'):
+        raise ValueError(F"unknown row_type: {row_type}")
+
+    if isinstance(dbh, MySQLPool):
+        with dbh.connection(exclusive=True) as pooled:
+            yield from stream_query(pooled, sql, values, batch_size=batch_size, row_type=row_type)
+        return
+
+    cursor = _get_cursor(dbh, buffered=False)
+    try:
+        do_sql(cursor, sql, values)
+        colnames = [d[0] for d in cursor.description]
+        if row_type == 'namedtuple':
+            Row = namedtuple('Row', colnames, rename=True)
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if row_type == 'tuple':
+                yield from rows
+            elif row_type == 'dict':
+                for row in rows:
+                    yield dict(zip(colnames, row))
+            elif row_type == 'namedtuple':
+                for row in rows:
+                    yield Row._make(row)
+            else:
+                columns = zip(*rows)
+                if HAS_NUMPY:
+                    yield {name: np.array(col) for name, col in zip(colnames, columns)}
+                else:
+                    yield {name: list(col) for name, col in zip(colnames, columns)}
+    finally:
+        cursor.close()          # drains any unread rows
+
+
 def do_sql(cursor, sql, values=tuple(), f=sys.stderr):
     ''' just execute sql, but also print sql to stderr (or some other file) if $DEBUG set. '''
     if os.environ.get('DEBUG', False):
         f.write('{}, values={}\n'.format(sql, str(values)))
+    if not sql_timing.hooks:
+        cursor.execute(sql, values)
+        return
+    t0 = time.perf_counter()
     cursor.execute(sql, values)
+    sql_timing.statement(sql, time.perf_counter() - t0, cursor.rowcount)
 
 def clear_table(dbh, db_name, table):
     with get_cursor(dbh) as cursor:
@@ -188,7 +345,7 @@ def save_obj(dbh, record, tablename, primary_key=None, debug=False):
     '''
     sql, all_values = build_upsert_sql(record, tablename, primary_key)
     with get_cursor(dbh) as cursor:
-        cursor.execute(sql, all_values)
+        do_sql(cursor, sql, all_values)
         try:
             return cursor.lastrowid
         except _MysqlError as e:
@@ -205,7 +362,7 @@ def build_upsert_sql(record, tablename, primary_key=None):
 
     returns: a tuple of (sql, values)
     '''
-    fields = record.keys()
+    fields = list(record.keys())
     all_values = [record.get(key) for key in fields] # don't use record.values() because order probably not guaranteed
     n_percents = '({})'.format(', '.join(['%s'] * len(fields)))
 
@@ -221,15 +378,70 @@ def build_upsert_sql(record, tablename, primary_key=None):
 
     return sql, all_values
 
+
+def save_objs(dbh, records, tablename, primary_key=None, batch_size=1000):
+    '''
+    Upsert many records (dicts), batch_size at a time, with one multi-row statement
+    (and one commit) per batch.  Consecutive records with the same keys share a batch.
+
+    returns: the total number of affected rows as reported by mysql
+    (1 per inserted row, 2 per updated row, 0 per unchanged row).
+    '''
+    n_affected = 0
+    batch = []
+    for record in records:
+        if batch and (len(batch) >= batch_size or record.keys() != batch[0].keys()):
+            n_affected += _save_batch(dbh, batch, tablename, primary_key)
+            batch = []
+        batch.append(record)
+    if batch:
+        n_affected += _save_batch(dbh, batch, tablename, primary_key)
+    return n_affected
+
+
+def _save_batch(dbh, records, tablename, primary_key):
+    sql, all_values = build_multi_upsert_sql(records, tablename, primary_key)
+    with get_cursor(dbh) as cursor:
+        do_sql(cursor, sql, all_values)
+        return cursor.rowcount
+
+
+def build_multi_upsert_sql(records, tablename, primary_key=None):
+    '''
+    Like build_upsert_sql(), but for a list of records that all have the same keys.
+    The update clause uses VALUES(col), so each value is only sent once.
+
+    returns: a tuple of (sql, values)
+    '''
+    fields = list(records[0].keys())
+    n_percents = '({})'.format(', '.join(['%s'] * len(fields)))
+    all_values = [record[field] for record in records for field in fields]
+
+    sql = 'INSERT INTO {} ({}) VALUES {}'.format(tablename, ', '.join(fields), ', '.join([n_percents] * len(records)))
+    if primary_key is not None:
+        other_fields = [field for field in fields if field != primary_key] or [primary_key]
+        updates = ', '.join(['{0}=VALUES({0})'.format(field) for field in other_fields])
+        sql += ' ON DUPLICATE KEY UPDATE {}'.format(updates)
+
+    return sql, all_values
+
     
 def table_exists(dbh, tablename):
+    '''
+    Is there a table (or view) named tablename ('table' or 'database.table')?
+    Looks in the information_schema catalogue rather than touching the table itself.
+    '''
+    if '.' in tablename:
+        db_name, tablename = tablename.split('.', 1)
+    else:
+        db_name = get_database(dbh)
+    if (get_host(dbh), db_name, tablename) in schema_cache.entries:
+        return True
+
     with get_cursor(dbh) as cursor:
-        try:
-            do_sql(cursor, 'SELECT COUNT(*) FROM {}'.format(tablename))
-            list(cursor)        # suck up cursor contents
-            return True
-        except _MysqlError as e:
-            return False
+        do_sql(cursor, 'SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s',
+               (db_name, tablename))
+        return cursor.fetchone() is not None
 
 def pw_encrypt(pwd):
     ''' shim for encryption functionality '''
@@ -241,5 +453,416 @@ def lock_tables(cursor, tablename, db_names):
     tables = ', '.join(['{}.{} WRITE'.format(db_name, tablename) for db_name in db_names])
     sql = 'LOCK TABLE {}'.format(tables)
     cursor.execute(sql)
-    yield
-    cursor.execute('UNLOCK TABLES')
+    try:
+        yield
+    finally:
+        cursor.execute('UNLOCK TABLES')
+
+
+LoadStats = namedtuple('LoadStats', ['n_rows', 'seconds', 'rows_per_sec'])
+
+_tsv_escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+
+def tsv_escape(value):
+    ''' render a value as a field for LOAD DATA's default (tab-separated, backslash-escaped) format '''
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat(' ')
+    return str(value).translate(_tsv_escapes)
+
+
+def write_tsv(stream, rows, columns):
+    ''' write rows (tuples in column order, or dicts) to stream in LOAD DATA format; return the row count '''
+    n_rows = 0
+    for row in rows:
+        if isinstance(row, dict):
+            row = [row.get(col) for col in columns]
+        stream.write('\t'.join(tsv_escape(value) for value in row))
+        stream.write('\n')
+        n_rows += 1
+    return n_rows
+
+
+def bulk_load(dbh, tablename, rows_or_path, columns, disable_keys=False, lock=False, replace=False):
+    '''
+    Load rows into tablename with LOAD DATA LOCAL INFILE; much faster than INSERTs for big loads.
+
+    dbh: connection opened with local_infile=True (see get_mysql())
+    rows_or_path: an iterable of rows (tuples in column order, or dicts), which are escaped and
+      streamed to a temp file first; or the path of a file already in LOAD DATA's default format.
+    disable_keys: ALTER TABLE ... DISABLE KEYS during the load (only affects non-unique MyISAM indexes).
+    lock: hold a WRITE lock on the table (via lock_tables()) for the duration of the load.
+    replace: replace rows with duplicate unique keys instead of skipping them.
+
+    returns: LoadStats(n_rows, seconds, rows_per_sec)
+    '''
+    t0 = time.time()
+    tmp_path = None
+    if isinstance(rows_or_path, str):
+        path = rows_or_path
+    else:
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', newline='', delete=False) as tmp:
+            tmp_path = path = tmp.name
+            write_tsv(tmp, rows_or_path, columns)
+
+    db_name = get_database(dbh)
+    sql = "LOAD DATA LOCAL INFILE %s {} INTO TABLE {}.{} CHARACTER SET utf8mb4 ({})".format(
+        'REPLACE' if replace else 'IGNORE', db_name, tablename, ', '.join(columns))
+    try:
+        with get_cursor(dbh) as cursor:
+            if lock:
+                with lock_tables(cursor, tablename, [db_name]):
+                    n_rows = _load_file(cursor, sql, path, db_name, tablename, disable_keys)
+            else:
+                n_rows = _load_file(cursor, sql, path, db_name, tablename, disable_keys)
+    finally:
+        if tmp_path is not None:
+            os.unlink(tmp_path)
+
+    seconds = time.time() - t0
+    return LoadStats(n_rows, seconds, n_rows / seconds if seconds else float('inf'))
+
+
+def _load_file(cursor, sql, path, db_name, tablename, disable_keys):
+    if disable_keys:
+        do_sql(cursor, 'ALTER TABLE {}.{} DISABLE KEYS'.format(db_name, tablename))
+    try:
+        do_sql(cursor, sql, (path,))
+        return cursor.rowcount
+    finally:
+        if disable_keys:
+            do_sql(cursor, 'ALTER TABLE {}.{} ENABLE KEYS'.format(db_name, tablename))
+
+
+# MySQL error codes worth retrying: deadlock, lock wait timeout, server gone away, lost connection
+TRANSIENT_ERRORS = {1205, 1213, 2006, 2013}
+
+
+def is_transient(e):
+    ''' is e an OperationalError that is likely to succeed on retry? '''
+    code = getattr(e, 'errno', None) if PYTHON2 else (e.args[0] if e.args else None)
+    return isinstance(e, OperationalError) and code in TRANSIENT_ERRORS
+
+
+class PoolExhausted(RuntimeError):
+    pass
+
+
+class MySQLPool:
+    '''
+    A thread-safe pool of connections made with get_mysql().
+
+    - At least min_size and at most max_size connections are open; checkout blocks
+      (up to checkout_timeout seconds) when all max_size are in use.
+    - Checkout is thread-local and re-entrant: nested connection() blocks in the same
+      thread share one connection.
+    - Connections idle for more than health_check_interval are ping()ed before reuse;
+      those idle for more than idle_timeout are closed (down to min_size).
+    - execute() retries statements that fail with transient errors on a fresh connection.
+
+    connect_args are passed on to connect() (get_mysql() by default).
+    '''
+    def __init__(self, host, database, user, password, min_size=1, max_size=10,
+                 idle_timeout=300, health_check_interval=30, checkout_timeout=30, retries=2,
+                 connect=get_mysql, **connect_args):
+        if not 0 <= min_size <= max_size:
+            raise ValueError(F"bad pool size: min_size={min_size}, max_size={max_size}")
+        self.conn_args = dict(host=host, database=database, user=user, password=password, **connect_args)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self.retries = retries
+        self.connect = connect
+
+        self.idle = []          # list of (dbh, last_used); most recently used last
+        self.n_open = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.local = threading.local()
+        for _ in range(min_size):
+            self.idle.append((self._open(), time.monotonic()))
+
+    @classmethod
+    def from_config(cls, config, section, **pool_args):
+        mysql_args = hashsubset(to_dict(config, section), 'host', 'database', 'user', 'password')
+        return cls(**mysql_args, **pool_args)
+
+    def _open(self):
+        dbh = self.connect(**self.conn_args)
+        with self.cond:
+            self.n_open += 1
+        return dbh
+
+    def _discard(self, dbh):
+        try:
+            dbh.close()
+        except Exception:
+            pass
+        with self.cond:
+            self.n_open -= 1
+            self.cond.notify()
+
+    def _healthy(self, dbh, idle_for):
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            if PYTHON2:
+                dbh.ping(reconnect=True, attempts=1)
+            else:
+                dbh.ping(reconnect=True)
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                # close connections idle too long (oldest first), keeping min_size open:
+                while self.idle and now - self.idle[0][1] > self.idle_timeout and self.n_open > self.min_size:
+                    stale, _ = self.idle.pop(0)
+                    self.n_open -= 1
+                    try:
+                        stale.close()
+                    except Exception:
+                        pass
+
+                if self.idle:
+                    dbh, last_used = self.idle.pop()
+                elif self.n_open < self.max_size:
+                    self.n_open += 1    # reserve a slot; connect outside the lock
+                    dbh = last_used = None
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0 or not self.cond.wait(remaining):
+                        raise PoolExhausted(F"no connection available after {self.checkout_timeout}s")
+                    continue
+
+            if dbh is None:
+                try:
+                    return self.connect(**self.conn_args)
+                except Exception:
+                    with self.cond:
+                        self.n_open -= 1
+                        self.cond.notify()
+                    raise
+            if self._healthy(dbh, now - last_used):
+                return dbh
+            self._discard(dbh)
+
+    def _checkin(self, dbh):
+        if self.closed:
+            self._discard(dbh)
+            return
+        with self.cond:
+            self.idle.append((dbh, time.monotonic()))
+            self.cond.notify()
+
+    @contextmanager
+    def connection(self, exclusive=False):
+        '''
+        check out a connection for the current thread; broken connections are not returned to the pool.
+        exclusive: check out a connection of its own, not shared with nested connection() blocks in this thread
+        (eg, for a result that stays open while other statements run).
+        '''
+        held = None if exclusive else getattr(self.local, 'dbh', None)
+        if held is not None:
+            self.local.depth += 1
+            try:
+                yield held
+            finally:
+                self.local.depth -= 1
+            return
+
+        t0 = time.perf_counter()
+        dbh = self._checkout()
+        if sql_timing.hooks:
+            sql_timing.wait('pool', time.perf_counter() - t0)
+        if not exclusive:
+            self.local.dbh, self.local.depth = dbh, 1
+        broken = False
+        try:
+            yield dbh
+        except OperationalError:
+            broken = True
+            raise
+        finally:
+            if not exclusive:
+                self.local.dbh = None
+            if broken:
+                self._discard(dbh)
+            else:
+                self._checkin(dbh)
+
+    @contextmanager
+    def cursor(self, **cursor_args):
+        ''' a pooled get_cursor(): commits when the block exits '''
+        with self.connection() as dbh:
+            with get_cursor(dbh, **cursor_args) as cursor:
+                yield cursor
+
+    def execute(self, sql, values=tuple(), fetch=False):
+        '''
+        Run sql via do_sql() and commit; return the fetched rows if fetch, else the affected row count.
+        Transient errors are retried (up to self.retries times) unless this thread is already
+        inside a connection() block, where a retry would silently split its transaction.
+        '''
+        nested = getattr(self.local, 'dbh', None) is not None
+        attempt = 0
+        while True:
+            try:
+                with self.cursor() as cursor:
+                    do_sql(cursor, sql, values)
+                    return cursor.fetchall() if fetch else cursor.rowcount
+            except OperationalError as e:
+                if nested or attempt >= self.retries or not is_transient(e):
+                    raise
+                attempt += 1
+                time.sleep(0.05 * 2 ** attempt)
+
+    def close(self):
+        ''' close all idle connections; connections checked out are closed when returned '''
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for dbh, _ in idle:
+            self._discard(dbh)
+
+    @property
+    def stats(self):
+        with self.cond:
+            return {'open': self.n_open, 'idle': len(self.idle), 'in_use': self.n_open - len(self.idle)}
+
+
+@contextmanager
+def _connection(dbh):
+    ''' yield dbh itself, or a connection checked out from dbh if it's a MySQLPool '''
+    if isinstance(dbh, MySQLPool):
+        with dbh.connection() as pooled:
+            yield pooled
+    else:
+        yield dbh
+
+
+CopyStats = namedtuple('CopyStats', ['n_rows', 'n_chunks', 'n_skipped', 'seconds'])
+
+
+def _key_chunks(dbh, table, key, chunk_size):
+    '''
+    yield (start, stop) key ranges of chunk_size rows each (the last may be shorter), found by
+    stepping through the key's index, so sparse keys don't make empty chunks
+    '''
+    with get_cursor(dbh) as cursor:
+        do_sql(cursor, F"SELECT MIN({key}), MAX({key}) FROM {table}")
+        start, hi = cursor.fetchone()
+        sql = F"SELECT {key} FROM {table} WHERE {key} >= %s ORDER BY {key} LIMIT 1 OFFSET %s"
+        while start is not None:
+            do_sql(cursor, sql, (start, chunk_size))
+            row = cursor.fetchone()
+            stop = row[0] if row else hi + 1
+            yield start, stop
+            start = row[0] if row else None
+
+
+def _merge_ranges(ranges):
+    ''' merge half-open [start, stop) key ranges that overlap or touch; returns a sorted list of [start, stop] '''
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return merged
+
+
+def _uncovered(chunks, done):
+    ''' the chunks (start, stop) not entirely within one of the ranges done (from _merge_ranges()) '''
+    starts = [r[0] for r in done]
+    answer = []
+    for start, stop in chunks:
+        i = bisect_right(starts, start) - 1
+        if i < 0 or done[i][1] < stop:
+            answer.append((start, stop))
+    return answer
+
+
+def copy_table(src_dbh, dst_dbh, tablename, workers=4, chunk_size=100000, batch_size=1000, checkpoint_path=None):
+    '''
+    Copy all rows of tablename from one database to a table of the same name in another.
+
+    The table is split, by its (single, integer) primary key, into chunks of chunk_size rows; each
+    chunk is streamed from the source (stream_query()) and upserted into the destination (save_objs()).
+    src_dbh and dst_dbh should be MySQLPools so each of the workers gets its own connections;
+    with plain connections, chunks are copied one at a time.
+
+    checkpoint_path: if given, the key ranges of completed chunks are recorded there, and a later call
+    with the same path skips chunks lying entirely within them (chunk bounds come from the data, so
+    they may differ between calls; chunks are upserted, so re-copying a partly copied chunk is harmless).
+    The checkpoint file is removed once the copy completes.
+
+    returns: CopyStats(n_rows, n_chunks, n_skipped, seconds)
+    '''
+    t0 = time.time()
+    with _connection(src_dbh) as dbh:
+        columns, column_info, primary_key = get_field_info(dbh, tablename)
+        if primary_key is None or column_info[primary_key]['py_type'] is not int:
+            raise ValueError(F"{tablename}: copy_table needs a single integer primary key")
+        src_db = get_database(dbh)
+        chunks = list(_key_chunks(dbh, F"{src_db}.{tablename}", primary_key, chunk_size))
+    if not chunks:
+        return CopyStats(0, 0, 0, time.time() - t0)
+
+    done = []                   # merged [start, stop) ranges copied so far
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('table') == tablename and 'ranges' in checkpoint:
+            done = _merge_ranges(checkpoint['ranges'])
+    todo = _uncovered(chunks, done)
+
+    sql = 'SELECT {} FROM {}.{} WHERE {} >= %s AND {} < %s'.format(
+        ', '.join(columns), src_db, tablename, primary_key, primary_key)
+    lock = threading.Lock()
+
+    def copy_chunk(chunk):
+        start, stop = chunk
+        with _connection(src_dbh) as src, _connection(dst_dbh) as dst:
+            rows = stream_query(src, sql, (start, stop), batch_size=batch_size, row_type='dict')
+            n_rows = 0
+
+            def counted(rows):
+                nonlocal n_rows
+                for row in rows:
+                    n_rows += 1
+                    yield row
+            save_objs(dst, counted(rows), tablename, primary_key=primary_key, batch_size=batch_size)
+
+        if checkpoint_path is not None:
+            with lock:
+                done[:] = _merge_ranges(done + [[start, stop]])
+                atomic_write(checkpoint_path, json.dumps({'table': tablename, 'ranges': done}))
+        return n_rows
+
+    if not (isinstance(src_dbh, MySQLPool) and isinstance(dst_dbh, MySQLPool)):
+        workers = 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(copy_chunk, chunk) for chunk in todo]
+        try:
+            n_rows = sum(future.result() for future in futures)
+        except BaseException:
+            for future in futures:
+                future.cancel()         # don't start more chunks after a failure
+            raise
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.unlink(checkpoint_path)
+    return CopyStats(n_rows, len(todo), len(chunks) - len(todo), time.time() - t0)
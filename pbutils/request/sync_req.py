@@ -1,6 +1,7 @@
 from typing import List
 import json
 import requests
+from pbutils.files import atomic_write
 from pbutils.request.utils import create_request_params, all_contexts, populate_profile
 from pbutils.request.logs import log
 
@@ -32,14 +33,15 @@ def run_profiles(profiles: List[dict], environ=None):
                     print(F"{req_params['url']}: timedout")
 
 
-def handle_response(profile, response, config):
+def handle_response(profile, response, config, writer=None):
     '''
     Output the response.
 
     Prints the url and status code of response.
     If -v or --verbose was given on cli, also prints the body of the response.
     If -q or --quiet, then prints nothing.
-    If 'output_path' is present in the request profile, then prints to disk at that path.
+    If 'output_path' is present in the request profile, then prints to disk at that path
+    (atomically; through writer, eg a pbutils.files.BulkWriter, if given).
     '''
     try:
         content = response.json()
@@ -50,10 +52,14 @@ def handle_response(profile, response, config):
     summary = F"{response.request.url}: {response.status_code}"
 
     if 'output_path' in profile:
-        with open(profile['output_path'], 'w') as output_stream:
-            output_stream.write(content)
-            log.debug(F"{profile['output_path']} written")
-            print(F"{profile['output_path']} written")
+        if writer is not None:
+            writer.write(profile['output_path'], content)
+            done = 'queued'         # written later, by one of writer's threads
+        else:
+            atomic_write(profile['output_path'], content)
+            done = 'written'
+        log.debug(F"{profile['output_path']} {done}")
+        print(F"{profile['output_path']} {done}")
     elif config.verbose:
         print(summary)
         print(content)
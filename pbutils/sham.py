@@ -12,6 +12,8 @@ import waitress
 from werkzeug.datastructures import ImmutableMultiDict
 from werkzeug.exceptions import MethodNotAllowed, NotFound
 
+from pbutils.files import atomic_open
+
 
 CapturedRequest = namedtuple('CapturedRequest', ['id', 'path', 'args', 'method', 'headers', 'body'])
 
@@ -156,5 +158,5 @@ class ShamRecorder:
         self.reqres.setdefault(path, []).append({'args': args, 'response': res})
 
     def write(self):
-        with open(self.fn, 'w') as f:
+        with atomic_open(self.fn) as f:
             json.dump(self.reqres, f, indent=2)
@@ -1,6 +1,16 @@
 '''
 A mixin class that knows how to merge overlapping spans together.
+
+SpanSet holds large numbers of spans as a pair of typed arrays, for when
+creating one SpanMixin object per span costs too much memory.
 '''
+from array import array
+from bisect import bisect_left
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 
 class SpanMixin(object):
@@ -61,6 +71,248 @@ class SpanMixin(object):
         return answer
 
 
+class SpanSet:
+    '''
+    A sorted collection of spans stored as parallel arrays of starts and stops.
+
+    Spans are closed, as with SpanMixin: (1, 5) and (5, 10) overlap.
+    The set operations (intersection, union, subtract) work on the merged
+    extents of both sets and return a new, merged SpanSet.  With numpy they
+    (and sorting and merging) are vectorized; without it they are linear
+    sweeps over the two sorted arrays.
+    '''
+    def __init__(self, starts=(), stops=(), typecode='q'):
+        if len(starts) != len(stops):
+            raise ValueError(F"starts and stops differ in length ({len(starts)} != {len(stops)})")
+        self.typecode = typecode
+        if HAS_NUMPY and len(starts):
+            a = np.asarray(starts, dtype=typecode)
+            b = np.asarray(stops, dtype=typecode)
+            lo, hi = np.minimum(a, b), np.maximum(a, b)
+            order = np.lexsort((hi, lo))
+            self.starts = _to_array(typecode, lo[order])
+            self.stops = _to_array(typecode, hi[order])
+            return
+        pairs = sorted((min(a, b), max(a, b)) for a, b in zip(starts, stops))
+        self.starts = array(typecode, [p[0] for p in pairs])
+        self.stops = array(typecode, [p[1] for p in pairs])
+
+    @classmethod
+    def _from_sorted(cls, starts, stops, typecode):
+        ''' build a SpanSet from arrays already known to be sorted and normalized '''
+        span_set = cls.__new__(cls)
+        span_set.typecode = typecode
+        span_set.starts = starts
+        span_set.stops = stops
+        return span_set
+
+    @classmethod
+    def _from_numpy(cls, starts, stops, typecode):
+        ''' build a SpanSet from numpy arrays already known to be sorted and normalized '''
+        return cls._from_sorted(_to_array(typecode, starts), _to_array(typecode, stops), typecode)
+
+    @classmethod
+    def from_spans(cls, spans, typecode='q'):
+        ''' spans: iterable of SpanMixin objects or (start, stop) tuples '''
+        starts = []
+        stops = []
+        for span in spans:
+            if isinstance(span, SpanMixin):
+                starts.append(span.start)
+                stops.append(span.stop)
+            else:
+                starts.append(span[0])
+                stops.append(span[1])
+        return cls(starts, stops, typecode=typecode)
+
+    def to_spans(self, span_class=SpanMixin):
+        ''' return a list of span_class objects, one per span '''
+        return [span_class(start, stop) for start, stop in zip(self.starts, self.stops)]
+
+    def to_numpy(self):
+        ''' return (starts, stops) as numpy arrays sharing memory with this set '''
+        if not HAS_NUMPY:
+            raise RuntimeError("numpy not installed")
+        return np.frombuffer(self.starts, dtype=self.starts.typecode), \
+            np.frombuffer(self.stops, dtype=self.stops.typecode)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.stops)
+
+    def __getitem__(self, i):
+        return self.starts[i], self.stops[i]
+
+    def __eq__(self, other):
+        return self.starts == other.starts and self.stops == other.stops
+
+    def __repr__(self):
+        return 'SpanSet({})'.format(', '.join('({}, {})'.format(*span) for span in self))
+
+    def merged(self):
+        ''' return a new SpanSet with all overlapping spans merged together '''
+        if HAS_NUMPY and len(self):
+            return SpanSet._from_numpy(*_merge_sorted(*self.to_numpy()), self.typecode)
+        starts = array(self.typecode)
+        stops = array(self.typecode)
+        for start, stop in self:
+            if stops and start <= stops[-1]:
+                if stop > stops[-1]:
+                    stops[-1] = stop
+            else:
+                starts.append(start)
+                stops.append(stop)
+        return SpanSet._from_sorted(starts, stops, self.typecode)
+
+    def overlaps(self, other):
+        ''' return a list of bools: does each span in self overlap any span in other? '''
+        other = other.merged()
+        if HAS_NUMPY and len(self) and len(other):
+            my_starts, my_stops = self.to_numpy()
+            o_starts, o_stops = other.to_numpy()
+            # first merged span in other whose stop reaches our start:
+            idx = np.searchsorted(o_stops, my_starts, side='left')
+            hit = idx < len(other)
+            hit[hit] = o_starts[idx[hit]] <= my_stops[hit]
+            return hit.tolist()
+
+        answer = []
+        for start, stop in self:
+            i = bisect_left(other.stops, start)
+            answer.append(i < len(other) and other.starts[i] <= stop)
+        return answer
+
+    def intersection(self, other):
+        ''' return the merged extents covered by both self and other '''
+        a, b = self.merged(), other.merged()
+        if HAS_NUMPY:
+            if not (len(a) and len(b)):
+                return SpanSet(typecode=self.typecode)
+            _, starts, stops = _intersect_merged(*a.to_numpy(), *b.to_numpy())
+            return SpanSet._from_numpy(starts, stops, self.typecode)
+        starts = array(self.typecode)
+        stops = array(self.typecode)
+        i = j = 0
+        while i < len(a) and j < len(b):
+            lo = max(a.starts[i], b.starts[j])
+            hi = min(a.stops[i], b.stops[j])
+            if lo <= hi:
+                starts.append(lo)
+                stops.append(hi)
+            if a.stops[i] < b.stops[j]:
+                i += 1
+            else:
+                j += 1
+        return SpanSet._from_sorted(starts, stops, self.typecode)
+
+    def union(self, other):
+        ''' return the merged extents covered by either self or other '''
+        if HAS_NUMPY and len(self) + len(other):
+            parts = [span_set.to_numpy() for span_set in (self, other) if len(span_set)]
+            starts = np.concatenate([part[0] for part in parts])
+            stops = np.concatenate([part[1] for part in parts])
+            order = np.lexsort((stops, starts))
+            return SpanSet._from_numpy(*_merge_sorted(starts[order], stops[order]), self.typecode)
+        starts = array(self.typecode)
+        stops = array(self.typecode)
+        i = j = 0
+        while i < len(self) or j < len(other):
+            if j >= len(other) or (i < len(self) and self[i] <= other[j]):
+                start, stop = self[i]
+                i += 1
+            else:
+                start, stop = other[j]
+                j += 1
+            if stops and start <= stops[-1]:
+                if stop > stops[-1]:
+                    stops[-1] = stop
+            else:
+                starts.append(start)
+                stops.append(stop)
+        return SpanSet._from_sorted(starts, stops, self.typecode)
+
+    def subtract(self, other):
+        '''
+        return the merged extents of self not covered by other.
+        Results share their endpoints with the removed spans: (1, 20) - (5, 10) = (1, 5), (10, 20).
+        '''
+        a, b = self.merged(), other.merged()
+        if HAS_NUMPY and len(a) and len(b):
+            a_starts, a_stops = a.to_numpy()
+            b_starts, b_stops = b.to_numpy()
+            # the gaps between b's spans, bounded by the outermost endpoints of either set:
+            first = min(a_starts[0], b_starts[0])
+            last = max(a_stops[-1], b_stops[-1])
+            gap_starts = np.concatenate(([first], b_stops))
+            gap_stops = np.concatenate((b_starts, [last]))
+            touched = np.searchsorted(b_starts, a_stops, side='right') > \
+                np.searchsorted(b_stops, a_starts, side='left')
+            which, starts, stops = _intersect_merged(a_starts, a_stops, gap_starts, gap_stops)
+            # keep what's left of a span, or a span (even an empty one) that b doesn't touch:
+            keep = (starts < stops) | ~touched[which]
+            return SpanSet._from_numpy(starts[keep], stops[keep], self.typecode)
+        starts = array(self.typecode)
+        stops = array(self.typecode)
+        j = 0
+        for start, stop in a:
+            while j < len(b) and b.stops[j] < start:
+                j += 1
+            k = j
+            touched = False
+            while k < len(b) and b.starts[k] <= stop:
+                touched = True
+                if b.starts[k] > start:
+                    starts.append(start)
+                    stops.append(b.starts[k])
+                start = max(start, b.stops[k])
+                if b.stops[k] >= stop:
+                    break
+                k += 1
+            if start < stop or not touched:
+                starts.append(start)
+                stops.append(stop)
+        return SpanSet._from_sorted(starts, stops, self.typecode)
+
+    def coverage(self):
+        ''' return the total length (sum of stop - start) covered by the merged spans '''
+        merged = self.merged()
+        if HAS_NUMPY and len(merged):
+            starts, stops = merged.to_numpy()
+            return (stops - starts).sum().item()
+        return sum(stop - start for start, stop in merged)
+
+
+def _to_array(typecode, values):
+    ''' copy a numpy array into an array.array of typecode '''
+    answer = array(typecode)
+    answer.frombytes(np.ascontiguousarray(values, dtype=typecode).tobytes())
+    return answer
+
+
+def _merge_sorted(starts, stops):
+    ''' merge spans sorted by start (numpy arrays); a span joins the group before it if it starts by the group's highest stop '''
+    reach = np.maximum.accumulate(stops)
+    breaks = np.flatnonzero(starts[1:] > reach[:-1]) + 1
+    return starts[np.concatenate(([0], breaks))], reach[np.concatenate((breaks - 1, [len(stops) - 1]))]
+
+
+def _intersect_merged(a_starts, a_stops, b_starts, b_stops):
+    '''
+    intersect two merged span sets (numpy arrays):
+    returns (index into a of each piece, piece starts, piece stops), in order.
+    '''
+    # the b spans overlapping a[i] are b[lo[i]:hi[i]]:
+    lo = np.searchsorted(b_stops, a_starts, side='left')
+    hi = np.searchsorted(b_starts, a_stops, side='right')
+    counts = np.maximum(hi - lo, 0)
+    which = np.repeat(np.arange(len(a_starts)), counts)
+    offsets = np.cumsum(counts) - counts
+    j = lo[which] + np.arange(counts.sum()) - offsets[which]
+    return which, np.maximum(a_starts[which], b_starts[j]), np.minimum(a_stops[which], b_stops[j])
+
+
 if __name__ == '__main__':
     # verify correctness of ovlp:
     s1 = SpanMixin(10, 20)
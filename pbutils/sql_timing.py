@@ -0,0 +1,176 @@
+'''
+In-process SQL statement instrumentation.
+
+mysql_utils.do_sql(), mysql_utils.get_cursor(), MySQLPool checkouts and (via engine
+events) sqla_core report to every hook in `hooks`; with no hooks installed the only cost
+is an empty-list check.  SqlStats is the standard hook: it keeps per-statement-fingerprint
+latency histograms and row counts, connection wait times, and logs slow statements.
+
+    stats = SqlStats(slow_threshold=0.5)
+    add_hook(stats)
+    ...
+    stats.dump('sql_stats.json')
+'''
+import re
+import json
+import time
+import logging
+import threading
+from functools import lru_cache
+
+import sqlalchemy as sa
+
+log = logging.getLogger(__name__)
+
+hooks = []
+
+
+def add_hook(hook):
+    '''
+    hook: an object with on_statement(sql, seconds, n_rows) and on_wait(source, seconds) methods.
+    '''
+    if hook not in hooks:
+        hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def statement(sql, seconds, n_rows=None):
+    ''' report an executed statement to all hooks; n_rows < 0 (unknown) is reported as None '''
+    if n_rows is not None and n_rows < 0:
+        n_rows = None
+    for hook in hooks:
+        hook.on_statement(sql, seconds, n_rows)
+
+
+def wait(source, seconds):
+    ''' report time spent waiting for a connection or cursor (source: eg 'pool', 'cursor') '''
+    for hook in hooks:
+        hook.on_wait(source, seconds)
+
+
+_literals = [
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), '?'),           # strings
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),               # numbers
+    (re.compile(r'(%s|:\w+|\?)(\s*,\s*(%s|:\w+|\?))+'), '?+'),  # lists of values/placeholders
+    (re.compile(r'\s+'), ' '),
+]
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    ''' normalize sql so statements differing only in literal values compare equal '''
+    for regex, repl in _literals:
+        sql = regex.sub(repl, sql)
+    return sql.strip().lower()
+
+
+class _Timing:
+    __slots__ = ('count', 'total', 'max', 'rows', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = {}       # k=b, v=count of timings in [2**(b-1), 2**b) microseconds
+
+    def add(self, seconds, n_rows=None):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if n_rows is not None:
+            self.rows += n_rows
+        b = int(seconds * 1e6).bit_length()
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_secs': self.total,
+            'mean_secs': self.total / self.count if self.count else 0.0,
+            'max_secs': self.max,
+            'rows': self.rows,
+            'histogram_us': {F"<{1 << b}": n for b, n in sorted(self.buckets.items())},
+        }
+
+
+class SqlStats:
+    '''
+    Hook that aggregates statement timings by fingerprint(), plus connection wait times by source.
+    Statements slower than slow_threshold seconds are logged (at WARNING) to slow_log.
+    '''
+    def __init__(self, slow_threshold=1.0, slow_log=log):
+        self.slow_threshold = slow_threshold
+        self.slow_log = slow_log
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.statements = {}
+            self.waits = {}
+            self.started = time.time()
+
+    def on_statement(self, sql, seconds, n_rows=None):
+        key = fingerprint(sql)
+        with self.lock:
+            timing = self.statements.get(key)
+            if timing is None:
+                timing = self.statements[key] = _Timing()
+            timing.add(seconds, n_rows)
+        if self.slow_threshold is not None and seconds >= self.slow_threshold:
+            self.slow_log.warning(F"slow query ({seconds:.3f}s): {sql}")
+
+    def on_wait(self, source, seconds):
+        with self.lock:
+            timing = self.waits.get(source)
+            if timing is None:
+                timing = self.waits[source] = _Timing()
+            timing.add(seconds)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'since': self.started,
+                'statements': {sql: timing.to_dict() for sql, timing in self.statements.items()},
+                'waits': {source: timing.to_dict() for source, timing in self.waits.items()},
+            }
+
+    def dump(self, path_or_stream):
+        ''' write to_dict() as json to a path or an open stream '''
+        if hasattr(path_or_stream, 'write'):
+            json.dump(self.to_dict(), path_or_stream, indent=2)
+        else:
+            with open(path_or_stream, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_sql_timing_t0', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, sql, parameters, context, executemany):
+    t0 = conn.info['_sql_timing_t0'].pop()
+    if hooks:
+        statement(sql, time.perf_counter() - t0, cursor.rowcount)
+
+
+def _handle_error(context):
+    starts = context.connection.info.get('_sql_timing_t0') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine):
+    ''' report every statement executed through a SqlAlchemy engine to the hooks (idempotent) '''
+    if not sa.event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        sa.event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        sa.event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        sa.event.listen(engine, 'handle_error', _handle_error)
+    return engine
@@ -6,14 +6,22 @@ Note: these are for use with the sqla ORM, mostly.
 '''
 
 import sys
+import time
 import logging
+import threading
 
+from collections import namedtuple
 from contextlib import contextmanager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from itertools import islice
+from sqlalchemy import create_engine, event, Table
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.orm import sessionmaker, class_mapper
+from sqlalchemy.pool import QueuePool
 from pbutils.dicts import hashsubset
 from pbutils.strings import qw
-from pbutils.configs import to_dict, get_config
+from pbutils.configs import to_dict, get_config, to_bool
+from pbutils.sql_timing import instrument_engine, wait, _Timing
+from pbutils.sqla_core import SimpleStore
 from sqlalchemy.ext.declarative import declarative_base
 
 # To install mysql connector (works on MacOSX, too):
@@ -31,46 +39,176 @@ Base = declarative_base()
 Session = None
 engine = None
 
+DEFAULT = 'default'
+engines = {}            # k=name, v=engine
+sessions = {}           # k=name, v=sessionmaker bound to engines[name]
 
-def sqlA_init_from_config_fn(config_fn, section):
+# engine options that may be given in a config section, and their types:
+engine_options = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_recycle': int,
+    'pool_timeout': float,
+    'pool_pre_ping': to_bool,
+    'echo': to_bool,
+}
+
+
+def engine_args_from_config(config, section):
+    ''' the engine_options found in config/section, converted to their types '''
+    return {k: engine_options[k](v) for k, v in to_dict(config, section).items() if k in engine_options}
+
+
+def sqlA_init_from_config_fn(config_fn, section, name=DEFAULT):
     '''
     Extract db connection information from config/section.  The following keys must be present in the config section:
     host, database, user, password
+    and any of engine_options (pool_size, max_overflow, pool_recycle, pool_timeout, pool_pre_ping, echo) may be.
     '''
     config = get_config(config_fn)
-    return sqlA_init_from_config(config, section)
+    return sqlA_init_from_config(config, section, name)
 
 
-def sqlA_init_from_config(config, section):
+def sqlA_init_from_config(config, section, name=DEFAULT):
     conn_args = hashsubset(to_dict(config, section), *qw('host database user password'))
-    return sqlA_init(**conn_args)
+    return sqlA_init(name=name, **conn_args, **engine_args_from_config(config, section))
 
 
-def sqlA_init(host, database, user, password):
+def sqlA_init(host, database, user, password, name=DEFAULT, **engine_args):
     '''
     Initialize all stuff we need for SqlAlchemy: gets engine, creates all classes, creates and returns Session
     Return the Session classed needed to create sessions
+
+    Each name gets its own engine and Session (see get_engine(), get_session());
+    the DEFAULT one is also kept in the module's engine and Session.
     '''
     global engine, Session
-    engine = get_SqlA_mysql_engine(host, database, user, password)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    return Session
+    eng = get_SqlA_mysql_engine(host, database, user, password, name=name, **engine_args)
+    Base.metadata.create_all(eng)
+    sessions[name] = sessionmaker(bind=eng)
+    if name == DEFAULT:
+        engine, Session = eng, sessions[name]
+    return sessions[name]
 
 
-def get_SqlA_mysql_engine(host, database, user, password):
+def get_SqlA_mysql_engine(host, database, user, password, name=None, **engine_args):
     if PYTHON2:
         dialect = 'mysql+mysqlconnector'
     elif PYTHON3:
         dialect = 'mysql+pymysql'
     eng_str = '{dialect}://{user}:{password}@{host}/{database}'.format(
         dialect=dialect, user=user, password=password, host=host, database=database)
-    return create_engine(eng_str)
+    return make_engine(eng_str, name=name, **engine_args)
+
+
+def make_engine(url, name=None, **engine_args):
+    '''
+    create_engine(url, **engine_args) with a pool whose checkouts are measured (see pool_metrics());
+    with a name, the engine is registered in engines.
+
+    engine_args are create_engine()'s, eg pool_size, max_overflow, pool_recycle, pool_pre_ping.
+    (The pool is always a QueuePool, so in-memory sqlite urls won't work.)
+    '''
+    eng = create_engine(url, poolclass=_MeasuredQueuePool, **engine_args)
+    eng.pool.metrics = PoolMetrics(name or repr(eng.url))     # repr() hides the password
+    event.listen(eng, 'checkout', eng.pool.metrics.on_checkout)
+    event.listen(eng, 'checkin', eng.pool.metrics.on_checkin)
+    instrument_engine(eng)
+    if name is not None:
+        old = engines.get(name)
+        if old is not None and old is not eng:
+            old.dispose()
+        engines[name] = eng
+    return eng
+
+
+def get_engine(name=DEFAULT):
+    return engines[name]
+
+
+class PoolMetrics:
+    '''
+    How long checkouts from an engine's pool waited for a connection, and how many
+    connections are in use.  Waits are also reported to sql_timing's hooks, as source 'pool:<name>'.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.waits = _Timing()
+            self.timeouts = 0
+            self.in_use = 0
+            self.max_in_use = 0
+
+    def on_wait(self, seconds, timed_out=False):
+        with self.lock:
+            self.waits.add(seconds)
+            if timed_out:
+                self.timeouts += 1
+        wait(F"pool:{self.name}", seconds)
+
+    def on_checkout(self, dbapi_conn, record, proxy):
+        with self.lock:
+            self.in_use += 1
+            if self.in_use > self.max_in_use:
+                self.max_in_use = self.in_use
+
+    def on_checkin(self, dbapi_conn, record):
+        with self.lock:
+            self.in_use -= 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'timeouts': self.timeouts,
+                'checkout_wait': self.waits.to_dict(),
+            }
+
+
+class _MeasuredQueuePool(QueuePool):
+    ''' QueuePool that reports the time each checkout waits to its metrics '''
+    metrics = None
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeout:
+            if self.metrics is not None:
+                self.metrics.on_wait(time.perf_counter() - t0, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.on_wait(time.perf_counter() - t0)
+        return conn
+
+    def recreate(self):
+        pool = super().recreate()       # on engine.dispose()
+        pool.metrics = self.metrics
+        return pool
+
+
+def pool_metrics(name=None):
+    '''
+    Return the pool metrics of the named engine (a dict), or of all named engines (k=name, v=dict).
+    Each: size, checked_out, overflow (from the pool), in_use, max_in_use, timeouts, checkout_wait (a histogram).
+    '''
+    if name is None:
+        return {name: pool_metrics(name) for name in engines}
+    pool = engines[name].pool
+    metrics = {'size': pool.size(), 'checked_out': pool.checkedout(), 'overflow': pool.overflow()}
+    metrics.update(pool.metrics.to_dict())
+    return metrics
 
 
 @contextmanager
-def get_session(**session_args):
-    session = Session(**session_args)
+def get_session(name=None, **session_args):
+    ''' a session of the named engine (or of Session, by default), committed on success '''
+    session = (sessions[name] if name is not None else Session)(**session_args)
     try:
         yield session
         try:
@@ -89,3 +227,85 @@ def session_dbh(session):
     ''' extract the db connection from a session '''
     return session.connection().connection.connection
 
+
+
+BulkStats = namedtuple('BulkStats', ['n_objects', 'n_batches', 'seconds', 'objects_per_sec'])
+
+
+def _chunks(items, size):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def _bulk_session(session_factory):
+    ''' like get_session(), but commit errors propagate '''
+    session = (session_factory or Session)()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _bulk_stats(what, n_objects, n_batches, t0):
+    seconds = time.time() - t0
+    rate = n_objects / seconds if seconds else float('inf')
+    log.info(F"{what}: {n_objects} objects in {n_batches} batches, {seconds:.2f}s ({rate:.0f}/s)")
+    return BulkStats(n_objects, n_batches, seconds, rate)
+
+
+def bulk_save(session_factory, objects, batch_size=1000, mapper=None):
+    '''
+    Insert many new objects in one transaction, batch_size at a time.
+
+    objects: ORM instances (saved with bulk_save_objects()), or, if mapper (a mapped class) is given,
+    dicts of its attribute values (saved with bulk_insert_mappings()).
+    The identity map is cleared after each batch, so memory use doesn't grow with the number of objects.
+    session_factory: a sessionmaker, eg sessions[name]; None for Session.
+
+    returns BulkStats(n_objects, n_batches, seconds, objects_per_sec)
+    '''
+    t0 = time.time()
+    n_objects = n_batches = 0
+    with _bulk_session(session_factory) as session:
+        for batch in _chunks(objects, batch_size):
+            if mapper is None:
+                session.bulk_save_objects(batch)
+            else:
+                session.bulk_insert_mappings(mapper, batch)
+            session.flush()
+            session.expunge_all()
+            n_objects += len(batch)
+            n_batches += 1
+    return _bulk_stats('bulk_save', n_objects, n_batches, t0)
+
+
+def bulk_upsert(session_factory, mapper, rows, batch_size=1000):
+    '''
+    Insert rows (dicts keyed by column name) into mapper's table (mapper: a mapped class, or a Table),
+    updating rows with the same primary key instead; one transaction (the session's, which
+    SimpleStore.upsert_many() joins), batch_size rows per statement.
+
+    returns BulkStats(n_objects, n_batches, seconds, objects_per_sec)
+    '''
+    t0 = time.time()
+    n_objects = n_batches = 0
+    if isinstance(mapper, Table):
+        table, bind_args = mapper, {}
+    else:
+        table, bind_args = class_mapper(mapper).local_table, {'mapper': mapper}
+    with _bulk_session(session_factory) as session:
+        store = SimpleStore(session.connection(**bind_args), table)
+        for batch in _chunks(rows, batch_size):
+            store.upsert_many(batch, batch_size)
+            n_objects += len(batch)
+            n_batches += 1
+    return _bulk_stats('bulk_upsert', n_objects, n_batches, t0)
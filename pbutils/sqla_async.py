@@ -0,0 +1,112 @@
+'''
+asyncio versions of sqla_core's init_sqla() and SimpleStore, on SqlAlchemy's asyncio engine
+(requires SqlAlchemy >= 1.4 and an async driver, eg aiosqlite or asyncmy).
+
+Each AsyncSimpleStore call runs the corresponding SimpleStore method on its own pooled
+connection (and transaction), so database writes can overlap with other I/O
+(eg the requests in pbutils.request.async_req).
+'''
+import asyncio
+import copy
+import logging
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from pbutils.sqla_core import SimpleStore, meta
+from pbutils.sql_timing import instrument_engine
+
+log = logging.getLogger(__name__)
+
+
+async def init_async_sqla(db_url, metadata=meta, **engine_args):
+    ''' create an AsyncEngine for db_url and create all tables in metadata; returns the engine '''
+    engine = create_async_engine(db_url, **engine_args)
+    instrument_engine(engine.sync_engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    return engine
+
+
+class AsyncSimpleStore:
+    """
+    The SimpleStore CRUD surface as coroutines.
+
+    At most max_concurrency operations run at once (each holds a pooled connection);
+    the rest wait their turn.  get() and iter() return lists rather than generators.
+    """
+
+    def __init__(self, engine, table, max_concurrency=10):
+        self.engine = engine
+        self.table = table
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # shallow copies of this share its statement caches:
+        self._template = SimpleStore(None, table)
+        instrument_engine(engine.sync_engine)
+
+    @property
+    def primary_keys(self):
+        return self._template.primary_keys
+
+    def cache_stats(self):
+        return self._template.cache_stats()
+
+    async def _run(self, f):
+        ''' run f(store) on a SimpleStore bound to a fresh connection; commit afterwards '''
+        async with self.semaphore:
+            async with self.engine.connect() as conn:
+                result = await conn.run_sync(lambda sync_conn: self._call(f, sync_conn))
+                await conn.commit()
+                return result
+
+    def _call(self, f, sync_conn):
+        ''' (in the sync adapter) call f on a copy of the template bound to sync_conn '''
+        store = copy.copy(self._template)
+        store.conn = sync_conn
+        store._stmt_hits = store._stmt_misses = 0
+        try:
+            return f(store)
+        finally:
+            self._template._stmt_hits += store._stmt_hits
+            self._template._stmt_misses += store._stmt_misses
+
+    async def insert(self, row):
+        return await self._run(lambda store: store.insert(row))
+
+    async def insert_many(self, rows, batch_size=1000):
+        rows = list(rows)
+        return await self._run(lambda store: store.insert_many(rows, batch_size=batch_size))
+
+    async def upsert_many(self, rows, batch_size=1000):
+        rows = list(rows)
+        return await self._run(lambda store: store.upsert_many(rows, batch_size=batch_size))
+
+    async def update_many(self, rows, batch_size=1000):
+        rows = list(rows)
+        return await self._run(lambda store: store.update_many(rows, batch_size=batch_size))
+
+    async def get_pk(self, pk):
+        return await self._run(lambda store: store.get_pk(pk))
+
+    async def get_many(self, pks, batch_size=500):
+        pks = list(pks)
+        return await self._run(lambda store: store.get_many(pks, batch_size=batch_size))
+
+    async def get(self, **where):
+        """ return a list of all rows (as dicts) with properties defined by **where (and, ==) """
+        return await self._run(lambda store: list(store.get(**where)))
+
+    async def iter(self, where=None, batch_size=1000, order_by_pk=True, as_dict=True):
+        """ see SimpleStore.iter(); all matching rows are returned as a list """
+        return await self._run(lambda store: list(
+            store.iter(where, batch_size=batch_size, order_by_pk=order_by_pk, as_dict=as_dict)))
+
+    async def delete(self, **where):
+        """ Delete all matching rows; returns the number deleted """
+        return await self._run(lambda store: store.delete(**where).rowcount)
+
+    async def update(self, pk, data):
+        """ update a given row based on a (single) primary key; returns the number updated """
+        return await self._run(lambda store: store.update(pk, data).rowcount)
+
+    async def clear(self):
+        await self._run(lambda store: store.clear())
@@ -1,6 +1,19 @@
+import re
+import time
+import pickle
+import hashlib
+import threading
 import sqlalchemy as sa
 import logging
-from pbutils.streams import records
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from collections.abc import Mapping
+from functools import lru_cache
+from pbutils.files import atomic_write
+from pbutils.lru_cache import LRUCache
+from pbutils.sql_timing import instrument_engine
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 log = logging.getLogger(__name__)
 
 meta = sa.MetaData()
@@ -10,23 +23,192 @@ engine = None
 def init_sqla(db_url):
     ''' returns a connection to the db pointed at by db_url '''
     global engine
-    engine = sa.create_engine(db_url)
+    engine = instrument_engine(sa.create_engine(db_url))
     conn = engine.connect()
     meta.create_all(engine)
     return engine, meta, conn
 
 
-def import_tables(engine, meta):
+def import_tables(engine, meta, lazy=False, cache_path=None):
     '''
     Get all tables from a db engine.
     Return a dict: k=tablename, v=table
+
+    lazy: return a LazyTables instead, which only reflects a table when it's first looked up
+    (table_by_name(meta, ...) looks there too).
+    cache_path: keep the reflected tables in a pickle file there, reused for as long as
+    schema_fingerprint(engine) is unchanged (implies a LazyTables).
     '''
-    meta.reflect(bind=engine)
-    return meta.tables
+    if not (lazy or cache_path):
+        meta.reflect(bind=engine)
+        return meta.tables
+    tables = LazyTables(engine, meta, cache_path)
+    meta.info['lazy_tables'] = tables
+    if not lazy:
+        tables.load_all()
+    return tables
 
 
 def table_by_name(meta, tablename):
-    return meta.tables.get(tablename)  # or none
+    table = meta.tables.get(tablename)
+    if table is None and 'lazy_tables' in meta.info:
+        table = meta.info['lazy_tables'].get(tablename)
+    return table  # or none
+
+
+_fingerprint_sql = {       # catalog queries covering columns, keys and constraints, and indexes
+    'sqlite': ('SELECT type, name, sql FROM sqlite_master ORDER BY type, name',),
+    'mysql': (
+        '''SELECT table_name, column_name, column_type, is_nullable, column_default, column_key, extra
+        FROM information_schema.columns WHERE table_schema = DATABASE() ORDER BY table_name, ordinal_position''',
+        '''SELECT table_name, constraint_name, constraint_type
+        FROM information_schema.table_constraints WHERE table_schema = DATABASE() ORDER BY table_name, constraint_name''',
+        '''SELECT table_name, constraint_name, ordinal_position, column_name,
+            referenced_table_schema, referenced_table_name, referenced_column_name
+        FROM information_schema.key_column_usage WHERE table_schema = DATABASE()
+        ORDER BY table_name, constraint_name, ordinal_position''',
+        '''SELECT table_name, index_name, seq_in_index, column_name, non_unique, sub_part, index_type
+        FROM information_schema.statistics WHERE table_schema = DATABASE() ORDER BY table_name, index_name, seq_in_index''',
+    ),
+    'postgresql': (
+        '''SELECT table_name, column_name, data_type, is_nullable, column_default
+        FROM information_schema.columns WHERE table_schema = current_schema() ORDER BY table_name, ordinal_position''',
+        '''SELECT table_name, constraint_name, constraint_type
+        FROM information_schema.table_constraints WHERE table_schema = current_schema()
+        ORDER BY table_name, constraint_name''',
+        '''SELECT table_name, constraint_name, ordinal_position, column_name, position_in_unique_constraint
+        FROM information_schema.key_column_usage WHERE table_schema = current_schema()
+        ORDER BY table_name, constraint_name, ordinal_position''',
+        '''SELECT constraint_name, table_schema, table_name, column_name
+        FROM information_schema.constraint_column_usage WHERE constraint_schema = current_schema()
+        ORDER BY constraint_name, table_schema, table_name, column_name''',
+        '''SELECT tablename, indexname, indexdef
+        FROM pg_indexes WHERE schemaname = current_schema() ORDER BY tablename, indexname''',
+    ),
+}
+
+
+def schema_fingerprint(engine):
+    '''
+    A hash of the table definitions (columns, keys and constraints, indexes) in the engine's
+    (default) schema, from its catalogs.  (Other dialects only get table names hashed.)
+    '''
+    queries = _fingerprint_sql.get(engine.dialect.name)
+    if queries is None:
+        rows = sorted(sa.inspect(engine).get_table_names())
+    else:
+        with engine.connect() as conn:
+            rows = [[tuple(row) for row in conn.execute(sa.text(sql))] for sql in queries]
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+
+def _copy_table(table, meta):
+    ''' copy a table into meta (Table.tometadata() was renamed to_metadata() in SqlAlchemy 1.4) '''
+    to_metadata = getattr(table, 'to_metadata', None) or table.tometadata
+    return to_metadata(meta)
+
+
+class LazyTables(Mapping):
+    '''
+    Read-only mapping: k=tablename, v=table, reflecting each table into meta the first time it's
+    looked up (only the table names are fetched up front).
+
+    With cache_path, reflected tables are pickled there (one at a time, so lookups only unpickle
+    what they need) along with the schema fingerprint, and later processes copy them from the
+    cache instead of reflecting, until the schema changes.
+    '''
+    def __init__(self, engine, meta, cache_path=None):
+        self.engine = engine
+        self.meta = meta
+        self.cache_path = cache_path
+        self.lock = threading.RLock()
+        self.fingerprint = schema_fingerprint(engine) if cache_path else None
+        self.cached = {}                # k=tablename, v=pickled MetaData holding just that table
+        self.names = None
+        if cache_path:
+            self._load_cache()
+        if self.names is None:
+            self.names = sa.inspect(engine).get_table_names()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning(F"ignoring unreadable table cache {self.cache_path}: {e}")
+            return
+        if data.get('fingerprint') == self.fingerprint:
+            self.names = data['names']
+            self.cached = data['tables']
+        else:
+            log.info(F"schema changed, ignoring table cache {self.cache_path}")
+
+    def _save_cache(self):
+        if self.cache_path:
+            data = {'fingerprint': self.fingerprint, 'names': self.names, 'tables': self.cached}
+            atomic_write(self.cache_path, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _remember(self):
+        ''' add tables reflected into meta to the cache; return True if there were any '''
+        new = [table for name, table in self.meta.tables.items()
+               if name not in self.cached and name in self.names]
+        for table in new:
+            single = sa.MetaData()
+            _copy_table(table, single)
+            self.cached[table.name] = pickle.dumps(single, protocol=pickle.HIGHEST_PROTOCOL)
+        return bool(new)
+
+    def _from_cache(self, tablename):
+        ''' copy a cached table, and (like reflection) the tables its foreign keys refer to, into meta '''
+        pickled = self.cached.get(tablename)
+        if pickled is None:
+            return None
+        table = _copy_table(pickle.loads(pickled).tables[tablename], self.meta)
+        for fk in table.foreign_keys:
+            target = fk.target_fullname.rsplit('.', 1)[0]
+            if target not in self.meta.tables and target in self.names:
+                self[target]
+        return table
+
+    def __getitem__(self, tablename):
+        table = self.meta.tables.get(tablename)
+        if table is not None:
+            return table
+        if tablename not in self.names:
+            raise KeyError(tablename)
+        with self.lock:
+            table = self.meta.tables.get(tablename)
+            if table is None:
+                table = self._from_cache(tablename)
+                if table is None:
+                    table = sa.Table(tablename, self.meta, autoload_with=self.engine)
+                    if self._remember():
+                        self._save_cache()
+            return table
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, tablename):
+        return tablename in self.names
+
+    def load_all(self):
+        ''' bring every table into meta, reflecting those not cached in one pass '''
+        with self.lock:
+            missing = [name for name in self.names if name not in self.meta.tables]
+            for name in missing:
+                self._from_cache(name)
+            uncached = [name for name in missing if name not in self.meta.tables]
+            if uncached:
+                self.meta.reflect(bind=self.engine, only=uncached)
+                if self._remember():
+                    self._save_cache()
+        return self
 
 
 def cols_of(table):
@@ -46,15 +228,305 @@ def url_of(connection):
     return connection.engine.url
 
 
-def do_stream(connection, stream):
+SqlStatement = namedtuple('SqlStatement', ['sql', 'line', 'offset'])  # line (1-based) and char offset of its start
+ScriptStats = namedtuple('ScriptStats', ['n_statements', 'n_transactions', 'seconds', 'statements_per_sec'])
+
+
+class SqlScriptError(Exception):
+    ''' a statement from a sql script failed; .statement is the SqlStatement, .error the original exception '''
+    def __init__(self, statement, error):
+        self.statement = statement
+        self.error = error
+        sql = statement.sql if len(statement.sql) <= 200 else statement.sql[:200] + '...'
+        super().__init__(F"line {statement.line} (offset {statement.offset}): {error}\n{sql}")
+
+
+_quote_ends = {"'": re.compile("'"), '"': re.compile('"'), '`': re.compile('`')}
+_mysql_quote_ends = {"'": re.compile(r"[\\']"), '"': re.compile(r'[\\"]'), '`': re.compile('`')}
+_delimiter_cmd = re.compile(r'\s*delimiter\s+(\S+)\s*$', re.I)
+
+
+@lru_cache(maxsize=8)
+def _specials(delimiter, mysql):
+    ''' regex matching anything that changes the splitter's state, or ends a statement '''
+    # in mysql, -- only starts a comment when followed by whitespace or a control char:
+    comments = r'--(?=[\s\x00-\x1f]|$)|#|' if mysql else '--|'
+    return re.compile("'|\"|`|/\\*|" + comments + re.escape(delimiter))
+
+
+def split_sql(stream, delimiter=';', mysql=True):
     '''
-    Execute all the statements in a stream.
+    Generate a SqlStatement for each statement in stream (any iterable of lines, eg an open file),
+    reading it a line at a time.
+
+    Delimiters inside '...', "..." or `...` quotes, /* */ comments and --/# line comments don't
+    count.  Line comments are dropped; /* */ comments are kept (so mysql's /*!40101 ... */ hints
+    still run).  mysql client "DELIMITER xx" lines change the delimiter.
+    mysql=False for standard sql: no backslash escapes in quotes, and # isn't a comment.
+    '''
+    quote_ends = _mysql_quote_ends if mysql else _quote_ends
+    parts = []
+    start = None                # (line, offset) of the current statement
+    state = None                # None, a quote char, or '*' (in a /* */ comment)
+    line_no = 0
+    base = 0                    # offset of the current line in the stream
+
+    def add(text, at):
+        nonlocal start
+        if start is None:
+            stripped = text.lstrip()
+            if not stripped:
+                return
+            at += len(text) - len(stripped)
+            text = stripped
+            start = (line_no, base + at)
+        parts.append(text)
+
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line_no += 1
+        if state is None and start is None:
+            m = _delimiter_cmd.match(line)
+            if m:
+                delimiter = m.group(1)
+                base += len(line)
+                continue
+        i, n = 0, len(line)
+        while i < n:
+            if state is None:
+                m = _specials(delimiter, mysql).search(line, i)
+                if m is None:
+                    add(line[i:], i)
+                    break
+                add(line[i:m.start()], i)
+                token = m.group()
+                i = m.end()
+                if token == delimiter:
+                    if start is not None:
+                        yield SqlStatement(''.join(parts).rstrip(), *start)
+                    parts, start = [], None
+                elif token in ('--', '#'):
+                    if parts:
+                        parts.append('\n')
+                    break
+                else:
+                    add(token, m.start())
+                    state = '*' if token == '/*' else token
+            elif state == '*':
+                j = line.find('*/', i)
+                if j < 0:
+                    parts.append(line[i:])
+                    break
+                parts.append(line[i:j + 2])
+                i = j + 2
+                state = None
+            else:
+                m = quote_ends[state].search(line, i)
+                if m is None:
+                    parts.append(line[i:])
+                    break
+                if m.group() == '\\':     # escapes the next char
+                    parts.append(line[i:m.end() + 1])
+                    i = m.end() + 1
+                    continue
+                parts.append(line[i:m.end()])     # '' inside a string just closes and reopens it
+                i = m.end()
+                state = None
+        base += n
+    if start is not None:
+        sql = ''.join(parts).rstrip()
+        if sql:
+            yield SqlStatement(sql, *start)
+
+
+_hint = r'^(?:/\*!\d*\s*)?'
+_session_re = re.compile(_hint + r'set\s', re.I)
+_lock_re = re.compile(_hint + r'(?:un)?lock\s+tables?\b', re.I)
+_use_re = re.compile(r'^use\s', re.I)
+_table_re = re.compile(_hint + r'''(?:insert\s+(?:ignore\s+)?into|replace\s+into|create\s+table(?:\s+if\s+not\s+exists)?
+    |alter\s+table|drop\s+table(?:\s+if\s+exists)?|truncate(?:\s+table)?|delete\s+from|update|copy)
+    \s+[`"\[]?([\w.$]+)''', re.I | re.X)
+
+
+def _table_of(sql):
+    ''' the table a statement writes to, or None '''
+    m = _table_re.match(sql)
+    return m.group(1).lower() if m else None
+
+
+def _exec_raw(connection, sql):
+    ''' execute sql as-is (no bind parameter parsing, so ':' and '%' in literals are safe) '''
+    connection = connection.execution_options(no_parameters=True)
+    if hasattr(connection, 'exec_driver_sql'):      # SqlAlchemy >= 1.4
+        return connection.exec_driver_sql(sql)
+    return connection.execute(sql)
+
+
+def _run_batch(connection, statements, session=()):
+    ''' execute statements in one transaction (connection's, if it has one open), after replaying session statements '''
+    for stmt in session:
+        _exec_raw(connection, stmt.sql)
+    with nullcontext() if connection.in_transaction() else connection.begin():
+        for stmt in statements:
+            try:
+                _exec_raw(connection, stmt.sql)
+            except Exception as e:
+                raise SqlScriptError(stmt, e) from e
+
+
+def _script_stats(n_statements, n_transactions, t0):
+    seconds = time.time() - t0
+    log.info(F"{n_statements} statements in {n_transactions} transactions, {seconds:.2f}s")
+    return ScriptStats(n_statements, n_transactions, seconds, n_statements / seconds if seconds else float('inf'))
+
+
+def do_stream(connection, stream, transaction_size=1000, workers=1, delimiter=';'):
+    '''
+    Execute all the statements in a stream (eg, a dump file), as split by split_sql().
     Blindly.  No safety whatsoever.  Caller's responsibilty.
 
-    Also not guaranteed to be correct; just splits on lines ending in ';'.
+    Statements are committed in transactions of up to transaction_size statements
+    (or, if connection already has a transaction open, all run in that one).
+    A failing statement raises SqlScriptError (giving its location in the stream);
+    its transaction is rolled back, earlier ones stay committed.
+
+    With workers > 1, statements writing to different tables (insert/create/alter/... <table>)
+    run in parallel on pooled connections from connection.engine, each table's in order.
+    SET statements and the latest USE run on every connection, ahead of the statements read after
+    them (a new SET first hands off the batches before it, a USE waits for them); LOCK/UNLOCK TABLES are dropped (locks are per-connection); any other statement
+    waits for everything before it to finish.
+    Cross-table dependencies (eg foreign keys) must be switched off, as mysqldump does.
+    In-memory sqlite databases aren't shared between connections: use workers=1.
+
+    returns ScriptStats(n_statements, n_transactions, seconds, statements_per_sec)
     '''
-    for stmt in records(stream, ";\n"):
-        connection.execute(sa.text(stmt).execution_options(autocommit=False))
+    if workers > 1:
+        return _do_stream_parallel(connection, stream, transaction_size, workers, delimiter)
+
+    t0 = time.time()
+    n_statements = n_transactions = 0
+    batch = []
+    for stmt in split_sql(stream, delimiter, _is_mysql(connection)):
+        batch.append(stmt)
+        if len(batch) >= transaction_size:
+            _run_batch(connection, batch)
+            n_statements += len(batch)
+            n_transactions += 1
+            batch = []
+    if batch:
+        _run_batch(connection, batch)
+        n_statements += len(batch)
+        n_transactions += 1
+    return _script_stats(n_statements, n_transactions, t0)
+
+
+def _is_mysql(connection):
+    return connection.dialect.name == 'mysql'
+
+
+def _do_stream_parallel(connection, stream, transaction_size, workers, delimiter):
+    t0 = time.time()
+    session = []                # SET statements, deduplicated, in order of first appearance
+    use = []                    # the latest USE statement, if any
+    seen = set()
+    pending = {}                # k=table, v=statements not yet submitted
+    last = {}                   # k=table, v=future of its latest batch
+    failures = []
+    counts = [0, 0]             # statements, transactions
+    lock = threading.Lock()
+    slots = threading.Semaphore(workers * 2)
+
+    def work(prev, batch, session):
+        if prev is not None:
+            prev.result()       # keep each table's batches in order
+        if failures:
+            return
+        try:
+            with connection.engine.connect() as conn:
+                _run_batch(conn, batch, session)
+            with lock:
+                counts[0] += len(batch)
+                counts[1] += 1
+        except Exception as e:
+            with lock:
+                failures.append(e)
+
+    def submit(table):
+        batch = pending.pop(table)
+        slots.acquire()
+        future = executor.submit(work, last.get(table), batch, tuple(session + use))
+        future.add_done_callback(lambda f: slots.release())
+        last[table] = future
+
+    def flush():
+        for table in list(pending):
+            submit(table)
+
+    def drain():
+        flush()
+        for future in last.values():
+            future.result()
+        last.clear()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:     # waits for all batches on the way out
+        for stmt in split_sql(stream, delimiter, _is_mysql(connection)):
+            if failures:
+                break
+            if _lock_re.match(stmt.sql):
+                continue
+            if _use_re.match(stmt.sql):
+                drain()             # batches so far belong to the previous database
+                use[:] = [stmt]
+                continue
+            if _session_re.match(stmt.sql):
+                if stmt.sql not in seen:
+                    flush()         # statements read so far run without it (eg a dump's trailing SETs)
+                    seen.add(stmt.sql)
+                    session.append(stmt)
+                continue
+            table = _table_of(stmt.sql)
+            if table is None:       # a barrier
+                drain()
+                if failures:
+                    break
+                with connection.engine.connect() as conn:
+                    _run_batch(conn, [stmt], session + use)
+                counts[0] += 1
+                counts[1] += 1
+                continue
+            batch = pending.setdefault(table, [])
+            batch.append(stmt)
+            if len(batch) >= transaction_size:
+                submit(table)
+        drain()
+    if failures:
+        raise failures[0]
+    return _script_stats(counts[0], counts[1], t0)
+
+
+_dialect_inserts = {       # insert() constructs with upsert clauses
+    'mysql': mysql.insert,
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def _mapping(row):
+    ''' mapping view of a result row (legacy RowProxy rows are already mappings) '''
+    return getattr(row, '_mapping', row)
+
+
+def _batches(rows, batch_size):
+    ''' yield lists of up to batch_size consecutive rows (dicts) that all have the same keys '''
+    batch = []
+    for row in rows:
+        if batch and (len(batch) >= batch_size or row.keys() != batch[0].keys()):
+            yield batch
+            batch = []
+        batch.append(row)
+    if batch:
+        yield batch
 
 
 def get_primary_keys(table):
@@ -82,61 +554,379 @@ class SimpleStore:
     Using this class imposes a lot of restrictions, including (but not limited to):
     - no joins
     - no group by, no ordering, no limits, etc...
+
+    Statements for insert/get_pk/get/delete/update are built once per combination of
+    fields (with bound parameters) and their compiled forms are cached; see cache_stats().
     """
 
     def __init__(self, conn, table):
-        self.conn = conn
+        ''' conn may be None for a store that is only ever copied and bound to connections later '''
         self.table = table
+        self.__primary_keys = None
+        self.__foreign_keys = None
+        self._stmts = {}
+        self._compiled = {}
+        self._stmt_hits = 0
+        self._stmt_misses = 0
+        self.conn = conn
+        if conn is not None:
+            instrument_engine(conn.engine)  # see pbutils.sql_timing
 
     @property
     def primary_keys(self):
         ''' return list of column objects designated as primary keys  '''
-        if not hasattr(self, '__primary_keys'):
+        if self.__primary_keys is None:
             self.__primary_keys = get_primary_keys(self.table)
         return self.__primary_keys
 
     @property
     def foreign_keys(self):
-        if not hasattr(self, '__foreign_keys'):
+        if self.__foreign_keys is None:
             self.__foreign_keys = get_foreign_key_cols(self.table)
         return self.__foreign_keys
 
+    def _stmt(self, key, build):
+        ''' return the statement cached under key, calling build() to create it on a miss '''
+        stmt = self._stmts.get(key)
+        if stmt is None:
+            self._stmt_misses += 1
+            stmt = self._stmts[key] = build()
+        else:
+            self._stmt_hits += 1
+        return stmt
+
+    def _execute(self, stmt, params):
+        ''' execute a cached statement, reusing its compiled form '''
+        # execution_options() makes a throwaway copy of conn, so it sees any transaction in progress:
+        return self.conn.execution_options(compiled_cache=self._compiled).execute(stmt, params)
+
+    def cache_stats(self):
+        ''' statement cache hits/misses, and the number of statements and compiled forms cached '''
+        lookups = self._stmt_hits + self._stmt_misses
+        return {
+            'hits': self._stmt_hits,
+            'misses': self._stmt_misses,
+            'hit_ratio': self._stmt_hits / lookups if lookups else 0.0,
+            'statements': len(self._stmts),
+            'compiled': len(self._compiled),
+        }
+
+    def _select_where(self, fields):
+        ''' select statement with an == bound parameter ('w_<field>') for each field '''
+        def build():
+            stmt = sa.select(self.table.c.values())
+            for field in fields:
+                stmt = stmt.where(getattr(self.table.c, field) == sa.bindparam('w_' + field))
+            return stmt
+        return self._stmt(('select',) + fields, build)
+
     def insert(self, row):
         """ Insert a row (dict) into the db """
-        stmt = self.table.insert().values(**row)
-        result = self.conn.execute(stmt)  # auto-commits
+        stmt = self._stmt(('insert',) + tuple(sorted(row)), self.table.insert)
+        result = self._execute(stmt, row)  # auto-commits
         return result.lastrowid
 
+    def insert_many(self, rows, batch_size=1000):
+        """
+        Insert rows (dicts) with one executemany() per batch, all in one transaction
+        (the caller's, if one is open).  Returns the number of rows inserted.
+        """
+        return self._execute_many(rows, batch_size, lambda columns: self.table.insert())
+
+    def upsert_many(self, rows, batch_size=1000):
+        """
+        Insert rows (dicts), updating existing rows with the same primary key instead.
+        Uses ON CONFLICT ... DO UPDATE (sqlite, postgresql) or ON DUPLICATE KEY UPDATE (mysql);
+        other dialects raise ValueError.  Returns the driver's affected-row count, which isn't the
+        number of rows: mysql counts 1 per inserted row and 2 per updated one (0 if unchanged).
+        """
+        return self._execute_many(rows, batch_size, self._upsert_stmt)
+
+    def update_many(self, rows, batch_size=1000):
+        """
+        Update rows (dicts that include the primary key) with one executemany() per batch,
+        all in one transaction.  Returns the number of rows updated.
+        """
+        pk_col = self.primary_keys[0]
+
+        def build(columns):
+            values = {col: sa.bindparam('b_' + col) for col in columns if col != pk_col.name}
+            return self.table.update().where(pk_col == sa.bindparam('b_' + pk_col.name)).values(values)
+
+        def bind(row):
+            return {'b_' + col: value for col, value in row.items()}
+
+        return self._execute_many(rows, batch_size, build, bind)
+
+    def _execute_many(self, rows, batch_size, build, bind=None):
+        """
+        Group consecutive rows with the same keys into batches; execute build(columns) once per batch.
+        Returns the total rowcount.
+        """
+        n_rows = 0
+        stmts = {}
+        # join a transaction the caller already has open:
+        with nullcontext() if self.conn.in_transaction() else self.conn.begin():
+            for batch in _batches(rows, batch_size):
+                columns = tuple(batch[0].keys())
+                if columns not in stmts:
+                    stmts[columns] = build(columns)
+                if bind is not None:
+                    batch = [bind(row) for row in batch]
+                result = self.conn.execute(stmts[columns], batch)
+                n_rows += result.rowcount if result.rowcount >= 0 else len(batch)
+        return n_rows
+
+    def _upsert_stmt(self, columns):
+        dialect = self.conn.dialect.name
+        insert = _dialect_inserts.get(dialect)
+        if insert is None:
+            raise ValueError(F"upsert_many: unsupported dialect {dialect}")
+        stmt = insert(self.table)
+        pk_names = [col.name for col in self.primary_keys]
+        others = [col for col in columns if col not in pk_names] or pk_names[:1]
+        if dialect == 'mysql':
+            return stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in others})
+        return stmt.on_conflict_do_update(index_elements=pk_names, set_={col: stmt.excluded[col] for col in others})
+
     def get_pk(self, pk):
         ''' return the row for the given primary key, or None '''
-        stmt = sa.select(self.table.c.values()).where(self.primary_keys[0] == pk)
-        return self.conn.execute(stmt).first()  # returns None when not found
+        stmt = self._select_where((self.primary_keys[0].name,))
+        return self._execute(stmt, {'w_' + self.primary_keys[0].name: pk}).first()  # returns None when not found
 
     def get(self, **where):
         """
         yield all rows (as dicts) with properties defined by **where (and, ==)
         """
-        stmt = sa.select(self.table.c.values())
-        for field, value in where.items():
-            stmt = stmt.where(getattr(self.table.c, field) == value)
-        results = self.conn.execute(stmt).fetchall()
+        fields = tuple(sorted(where))
+        stmt = self._select_where(fields)
+        results = self._execute(stmt, {'w_' + field: where[field] for field in fields}).fetchall()
 
         for row in results:
-            yield dict(row.items())
+            yield dict(_mapping(row))
+
+    def iter(self, where=None, batch_size=1000, order_by_pk=True, as_dict=True):
+        """
+        Lazily yield all rows matching where (a dict; and, ==), batch_size rows per round trip.
+
+        With order_by_pk, rows come in primary key order via keyset pagination: each batch is a
+        separate query starting after the last key seen, so no cursor is held open between batches.
+        Otherwise a single streamed (server-side, where supported) query is used.
+
+        Rows are yielded as dicts, or as plain tuples (in column order) if as_dict is False.
+        """
+        stmt = sa.select(self.table.c.values())
+        for field, value in (where or {}).items():
+            stmt = stmt.where(getattr(self.table.c, field) == value)
+        make_row = (lambda row: dict(_mapping(row))) if as_dict else tuple
+
+        if not order_by_pk:
+            result = self.conn.execution_options(stream_results=True).execute(stmt)
+            try:
+                while True:
+                    rows = result.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield make_row(row)
+            finally:
+                result.close()
+            return
+
+        pks = self.primary_keys
+        pk_key = sa.tuple_(*pks) if len(pks) > 1 else pks[0]
+        stmt = stmt.order_by(*pks).limit(batch_size)
+        last = None
+        while True:
+            page = stmt
+            if last is not None:
+                page = page.where(pk_key > (sa.tuple_(*last) if len(pks) > 1 else last[0]))
+            rows = self.conn.execute(page).fetchall()
+            for row in rows:
+                yield make_row(row)
+            if len(rows) < batch_size:
+                break
+            last = [_mapping(rows[-1])[pk] for pk in pks]
+
+    def get_many(self, pks, batch_size=500):
+        """
+        Fetch the rows for many (single-column) primary keys with IN queries of up to batch_size keys.
+        Returns a dict: k=primary key, v=row (as returned by get_pk()); missing keys are absent.
+        """
+        pk_col = self.primary_keys[0]
+        pks = list(pks)
+        found = {}
+        for i in range(0, len(pks), batch_size):
+            stmt = sa.select(self.table.c.values()).where(pk_col.in_(pks[i:i + batch_size]))
+            for row in self.conn.execute(stmt):
+                found[_mapping(row)[pk_col]] = row
+        return found
 
     def delete(self, **where):
         """ Delete all matching rows """
-        stmt = self.table.delete()
-        for field, value in where.items():
-            stmt = stmt.where(getattr(self.table.c, field) == value)
-        return self.conn.execute(stmt)
+        fields = tuple(sorted(where))
+
+        def build():
+            stmt = self.table.delete()
+            for field in fields:
+                stmt = stmt.where(getattr(self.table.c, field) == sa.bindparam('w_' + field))
+            return stmt
+        stmt = self._stmt(('delete',) + fields, build)
+        return self._execute(stmt, {'w_' + field: where[field] for field in fields})
 
     def update(self, pk, data):
         """ update a given row based on a (single) primary key (named 'id') """
         pk_col = self.primary_keys[0]
-        stmt = self.table.update().where(pk_col == pk).values(**data)  # todo: c.id -> pks
-        return self.conn.execute(stmt)
+        fields = tuple(sorted(data))
+
+        def build():
+            values = {field: sa.bindparam('v_' + field) for field in fields}
+            return self.table.update().where(pk_col == sa.bindparam('w_pk')).values(values)  # todo: c.id -> pks
+        stmt = self._stmt(('update',) + fields, build)
+        params = {'v_' + field: value for field, value in data.items()}
+        params['w_pk'] = pk
+        return self._execute(stmt, params)
 
     def clear(self):
         ''' delete all assets '''
         self.conn.execute(self.table.delete())  # auto-commits
+
+
+class CachedStore(SimpleStore):
+    """
+    SimpleStore with a read-through row cache for get_pk()/get_many(), keyed by (single) primary key.
+
+    The cache holds up to max_size rows (least recently used are dropped first), each for at most
+    ttl seconds.  Writes made through this store invalidate the affected rows (delete() with
+    anything other than the primary key, and clear(), empty the whole cache); writes made
+    elsewhere are only noticed when the ttl expires.
+    """
+
+    def __init__(self, conn, table, max_size=10000, ttl=60):
+        super().__init__(conn, table)
+        self.ttl = ttl
+        self.rows = LRUCache(max_size)
+        self.hits = 0
+        self.misses = 0
+        self.n_lookups = 0
+        self.lookup_secs = 0.0
+
+    def _cached(self, pk, now):
+        ''' return (True, row) if pk is cached and fresh, else (False, None) '''
+        node = self.rows.cache.get(pk)
+        if node is None:
+            return False, None
+        row, expires = node.value
+        if expires < now:
+            self.rows.remove(pk)
+            return False, None
+        self.rows.insert(pk, node.value)  # now most recent
+        return True, row
+
+    def _invalidate(self, pks):
+        for pk in pks:
+            if pk in self.rows.cache:
+                self.rows.remove(pk)
+
+    def invalidate_all(self):
+        self.rows = LRUCache(self.rows.max_size)
+
+    def get_pk(self, pk):
+        t0 = time.perf_counter()
+        found, row = self._cached(pk, time.monotonic())
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+            row = super().get_pk(pk)
+            if row is not None:
+                self.rows.insert(pk, (row, time.monotonic() + self.ttl))
+        self.n_lookups += 1
+        self.lookup_secs += time.perf_counter() - t0
+        return row
+
+    def get_many(self, pks, batch_size=500):
+        """ like SimpleStore.get_many(), but only cache misses are fetched (in batched IN queries) """
+        t0 = time.perf_counter()
+        now = time.monotonic()
+        answer = {}
+        missing = []
+        for pk in pks:
+            found, row = self._cached(pk, now)
+            if found:
+                answer[pk] = row
+            else:
+                missing.append(pk)
+        self.hits += len(answer)
+        self.misses += len(missing)
+
+        if missing:
+            fetched = super().get_many(missing, batch_size=batch_size)
+            expires = time.monotonic() + self.ttl
+            for pk, row in fetched.items():
+                self.rows.insert(pk, (row, expires))
+            answer.update(fetched)
+        self.n_lookups += 1
+        self.lookup_secs += time.perf_counter() - t0
+        return answer
+
+    def row_cache_stats(self):
+        ''' hit ratio and mean lookup latency of get_pk()/get_many() '''
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': self.rows.size,
+            'mean_lookup_secs': self.lookup_secs / self.n_lookups if self.n_lookups else 0.0,
+        }
+
+    def _pks_of(self, rows):
+        pk_name = self.primary_keys[0].name
+        return [row[pk_name] for row in rows if pk_name in row]
+
+    def insert(self, row):
+        pk = super().insert(row)
+        self._invalidate([pk] + self._pks_of([row]))
+        return pk
+
+    def insert_many(self, rows, batch_size=1000):
+        rows = list(rows)
+        self._invalidate(self._pks_of(rows))
+        return super().insert_many(rows, batch_size=batch_size)
+
+    def upsert_many(self, rows, batch_size=1000):
+        rows = list(rows)
+        try:
+            return super().upsert_many(rows, batch_size=batch_size)
+        finally:
+            self._invalidate(self._pks_of(rows))
+
+    def update(self, pk, data):
+        try:
+            return super().update(pk, data)
+        finally:
+            self._invalidate([pk])
+
+    def update_many(self, rows, batch_size=1000):
+        rows = list(rows)
+        try:
+            return super().update_many(rows, batch_size=batch_size)
+        finally:
+            self._invalidate(self._pks_of(rows))
+
+    def delete(self, **where):
+        try:
+            return super().delete(**where)
+        finally:
+            pk_name = self.primary_keys[0].name
+            if list(where) == [pk_name]:
+                self._invalidate([where[pk_name]])
+            else:
+                self.invalidate_all()
+
+    def clear(self):
+        try:
+            super().clear()
+        finally:
+            self.invalidate_all()
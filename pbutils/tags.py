@@ -1,8 +1,24 @@
 '''
+A key/value tag store: objects (oids) with any number of key=value tags,
+searchable by all of a set of tags.
+
+search() intersects the terms' posting lists in the db (GROUP BY oid HAVING COUNT = n_terms,
+over the (key, value, oid) index); TagIndex / search_cached() keep sorted oid arrays in
+memory and intersect them smallest first.
 '''
-import random
+from array import array
+from bisect import bisect_left
+
 import sqlalchemy as sa
 
+from pbutils.lru_cache import LRUCache
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 create_sql = '''
 CREATE TABLE IF NOT EXISTS tags (
 oid INT,
@@ -11,16 +27,20 @@ value VARCHAR(255)
 );
 CREATE INDEX IF NOT EXISTS oid_idx ON tags (oid);
 CREATE INDEX IF NOT EXISTS key_idx ON tags (key);
-CREATE INDEX IF NOT EXISTS value_idx ON tags (value)
+CREATE INDEX IF NOT EXISTS value_idx ON tags (value);
+CREATE INDEX IF NOT EXISTS key_value_oid_idx ON tags (key, value, oid)
 '''
 
 
 db = None
+index = None    # a TagIndex on db, kept current by this module's writes
+
 
-def init(db_uri):
-    global db
+def init(db_uri, max_terms=1000):
+    global db, index
     db = sa.create_engine(db_uri)
     create_table()
+    index = TagIndex(db, max_terms)
 
 
 def create_table():
@@ -43,6 +63,7 @@ def insert_obj(**tags):
         for key, value in tags.items():
             conn.execute(sa.text(sql), oid=oid, key=key, value=value)
 
+    _invalidate(tags)
     return oid
 
 
@@ -51,6 +72,12 @@ def add_tags(oid, **tags):
     with db.begin() as conn:
         for key, value in tags.items():
             conn.execute(sa.text(sql), oid=oid, key=key, value=value)
+    _invalidate(tags)
+
+
+def _invalidate(tags=None):
+    if index is not None:
+        index.invalidate(tags)
 
 
 def get_tags(oid):
@@ -79,38 +106,101 @@ def get_objects(key=None, value=None):
         return [row[0] for row in results]
 
 
+def _terms_clause(tags):
+    ''' (sql, params) matching rows with any of the key=value tags '''
+    terms = ' OR '.join(F"(key=:k{i} AND value=:v{i})" for i in range(len(tags)))
+    params = {}
+    for i, (key, value) in enumerate(tags.items()):
+        params[F"k{i}"] = key
+        params[F"v{i}"] = value
+    return terms, params
+
+
 def search(**tags):
+    ''' return the set of oids that have all of the given tags '''
     if len(tags) == 0:
         raise ValueError("no tags to search")
 
-    tblname = 'tags'
+    terms, params = _terms_clause(tags)
+    sql = F"SELECT oid FROM tags WHERE {terms} GROUP BY oid HAVING COUNT(DISTINCT key) = :n_terms"
     with db.begin() as conn:
-        for key, value in tags.items():
-            tblname = _search(conn, tblname, key, value)
-            if tblname is None:
-                return set()
-        results = conn.execute(sa.text(F"SELECT oid FROM {tblname}")).fetchall()
+        results = conn.execute(sa.text(sql), n_terms=len(tags), **params).fetchall()
         return set(row[0] for row in results)
 
 
-def _search(conn, src_table, key=None, value=None):
-    # find oids for this key/value:
-    sql = F"SELECT oid FROM {src_table} WHERE key=:key AND value=:value"
-    results = conn.execute(sa.text(sql), key=key, value=value).fetchall()
-    oids = [row[0] for row in results]
-    if not oids:
-        return None
-    oids = ", ".join(str(oid) for oid in oids)
+def search_cached(**tags):
+    ''' search() using the in-memory index '''
+    return index.search(**tags)
+
+
+class TagIndex:
+    '''
+    In-memory posting lists: sorted arrays of the oids having each key=value tag, loaded from
+    the tags table on first use.  At most max_terms lists are kept (least recently loaded dropped).
+
+    search() intersects them starting from the smallest: each remaining candidate is binary-searched
+    in the next larger list, so the cost is about len(smallest) * log(len(largest)).
+    '''
+    def __init__(self, engine, max_terms=1000):
+        self.engine = engine
+        self.postings = LRUCache(max_terms)     # k=(key, value), v=sorted oids
+
+    def invalidate(self, tags=None):
+        ''' forget the posting lists of tags (a dict), or all of them '''
+        if tags is None:
+            self.postings = LRUCache(self.postings.max_size)
+            return
+        for key, value in tags.items():
+            term = (key, str(value))
+            if term in self.postings.cache:
+                self.postings.remove(term)
+
+    def posting(self, key, value):
+        ''' return the sorted oids having tag key=value (numpy array, or array('q') without numpy) '''
+        term = (key, str(value))     # values are stored as strings
+        oids = self.postings.get(term)
+        if oids is None:
+            oids = self._load(key, value)
+            self.postings.insert(term, oids)
+        return oids
+
+    def _load(self, key, value):
+        sql = "SELECT DISTINCT oid FROM tags WHERE key=:key AND value=:value ORDER BY oid"
+        with self.engine.connect() as conn:
+            results = conn.execute(sa.text(sql), key=key, value=value)
+            if HAS_NUMPY:
+                return np.fromiter((row[0] for row in results), dtype=np.int64)
+            return array('q', (row[0] for row in results))
+
+    def search(self, **tags):
+        ''' return the set of oids that have all of the given tags '''
+        if len(tags) == 0:
+            raise ValueError("no tags to search")
+        postings = [self.posting(key, value) for key, value in tags.items()]
+        return set(int(oid) for oid in intersect(postings))
+
+
+def intersect(postings):
+    ''' intersect sorted oid arrays, smallest first; returns a sorted sequence '''
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for oids in postings[1:]:
+        if len(result) == 0:
+            break
+        if HAS_NUMPY:
+            result = np.asarray(result)
+            positions = np.searchsorted(oids, result)
+            found = positions < len(oids)
+            found[found] = oids[positions[found]] == result[found]
+            result = result[found]
+        else:
+            result = [oid for oid in result if _contains(oids, oid)]
+    return result
+
 
-    # create temp table with all tag info for these oids:
-    dst_table = ''.join(chr(random.randint(ord('A'), ord('Z'))) for _ in range(5))
-    sql = F"""CREATE TEMP TABLE {dst_table} AS
-WITH select0 AS (
-  SELECT oid, key, value FROM {src_table}
-  WHERE oid IN ({oids})
-) SELECT * FROM select0"""
-    conn.execute(sa.text(sql))
-    return dst_table
+def _contains(oids, oid):
+    i = bisect_left(oids, oid)
+    return i < len(oids) and oids[i] == oid
 
 
 def _dump(conn, tablename):
@@ -130,6 +220,7 @@ def remove_object(oid=None):
 
     with db.begin() as conn:
         conn.execute(sa.text(sql), **args)
+    _invalidate()
 
 
 if __name__ == '__main__':
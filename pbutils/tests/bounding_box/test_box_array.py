@@ -0,0 +1,35 @@
+import pytest
+import pbutils.bounding_box as bb
+from pbutils.bounding_box import BoundingBox, BoxArray
+
+groups = [
+    [(0, 0), (10, 5), (3, -2)],
+    [(1, 1)],
+    [(-4, 7), (2, 9)],
+]
+expected = [(5, 0, -2, 10), (1, 1, 1, 1), (9, -4, 7, 2)]
+
+
+def as_tuple(box):
+    return box.top, box.left, box.bottom, box.right
+
+
+def test_from_list():
+    assert [as_tuple(BoundingBox.from_list(pts)) for pts in groups] == expected
+
+
+@pytest.mark.parametrize('has_numpy', [True, False])
+def test_from_points(monkeypatch, has_numpy):
+    if has_numpy and not bb.HAS_NUMPY:
+        pytest.skip('numpy not installed')
+    monkeypatch.setattr(bb, 'HAS_NUMPY', has_numpy)
+    box_array = BoxArray.from_points(groups)
+    assert len(box_array) == 3
+    assert [as_tuple(box) for box in box_array] == expected
+    assert as_tuple(box_array[2]) == expected[2]
+    assert list(box_array.areas()) == [BoundingBox(*box).area for box in expected]
+
+
+def test_slots():
+    with pytest.raises(AttributeError):
+        BoundingBox(1, 0, 0, 1).color = 'red'
@@ -0,0 +1,58 @@
+import random
+import pytest
+from pbutils.bounding_box import BoundingBox, BoxIndex, HAS_NUMPY
+
+
+def random_boxes(n, seed):
+    rnd = random.Random(seed)
+    boxes = []
+    for _ in range(n):
+        left = rnd.uniform(0, 1000)
+        bottom = rnd.uniform(0, 1000)
+        boxes.append(BoundingBox(bottom + rnd.uniform(0, 30), left, bottom, left + rnd.uniform(0, 30)))
+    return boxes
+
+
+def test_query():
+    boxes = random_boxes(2000, 1)
+    index = BoxIndex(boxes, node_capacity=8)
+    for window in random_boxes(50, 2):
+        expected = sorted(i for i, box in enumerate(boxes) if box.intersects(window))
+        assert sorted(index.query(window)) == expected
+
+
+def test_nearest():
+    boxes = random_boxes(500, 3)
+    index = BoxIndex(boxes)
+    dists = sorted((box.distance(500, 500), i) for i, box in enumerate(boxes))
+    found = index.nearest(500, 500, k=5)
+    assert [d for d, _ in found] == [d for d, _ in dists[:5]]
+
+
+def test_join():
+    boxes1 = random_boxes(1000, 4)
+    boxes2 = random_boxes(300, 5)
+    expected = {(i, j) for i, b1 in enumerate(boxes1) for j, b2 in enumerate(boxes2) if b1.intersects(b2)}
+    assert set(BoxIndex(boxes1).join(BoxIndex(boxes2, node_capacity=4))) == expected
+
+
+def test_empty():
+    index = BoxIndex([])
+    assert index.query(BoundingBox(1, 0, 0, 1)) == []
+    assert index.nearest(0, 0) == []
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason='numpy not installed')
+def test_batch_ops():
+    from pbutils.bounding_box import to_array, areas, intersections
+    boxes1 = random_boxes(100, 6)
+    boxes2 = random_boxes(100, 7)
+    arr1, arr2 = to_array(boxes1), to_array(boxes2)
+    assert list(areas(arr1)) == pytest.approx([b.area for b in boxes1])
+
+    result, mask = intersections(arr1, arr2)
+    for b1, b2, row, ok in zip(boxes1, boxes2, result, mask):
+        expected = b1.intersection(b2)
+        assert ok == (expected is not None)
+        if ok:
+            assert list(row) == pytest.approx([expected.top, expected.left, expected.bottom, expected.right])
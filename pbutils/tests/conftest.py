@@ -1,4 +1,6 @@
 import pytest
+import pymysql.cursors
+import sqlalchemy as sa
 from pbutils.sqla_core import init_sqla, import_tables
 
 
@@ -17,3 +19,105 @@ def eng_meta_conn(sqlite_test_db_url):
 def tables(eng_meta_conn):
     engine, meta, conn = eng_meta_conn
     yield import_tables(engine, meta)
+
+
+@pytest.fixture
+def things_table():
+    ''' an in-memory sqlite table: things(id INTEGER PRIMARY KEY, name, n) '''
+    engine = sa.create_engine('sqlite://')
+    meta = sa.MetaData()
+    table = sa.Table('things', meta,
+                     sa.Column('id', sa.Integer, primary_key=True),
+                     sa.Column('name', sa.String(32)),
+                     sa.Column('n', sa.Integer))
+    meta.create_all(engine)
+    yield table, engine.connect()
+
+
+class FakeCursor:
+    ''' DB-API cursor stand-in; each execute() gets its results from the connection's respond() '''
+    def __init__(self, conn, unbuffered=False):
+        self.conn = conn
+        self.unbuffered = unbuffered
+        self.rows = []
+        self.rowcount = 0
+        self.description = conn.description
+        self.fetch_sizes = []
+        self.closed = False
+
+    def execute(self, sql, values=()):
+        streaming = self.conn.streaming
+        if streaming is not None and not streaming.closed:
+            raise AssertionError('connection still has an unread result')
+        answer = self.conn.respond(sql, values)
+        self.conn.executed.append(sql)
+        if isinstance(answer, int):
+            self.rows, self.rowcount = [], answer
+        else:
+            self.rows = list(answer or ())
+            self.rowcount = len(self.rows)
+        if self.unbuffered and self.rows:
+            self.conn.streaming = self
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConn:
+    '''
+    pymysql connection stand-in.  respond(sql, values) gives each statement's rows (a list),
+    or, for a write, its rowcount (an int); it may raise, eg OperationalError.
+    As with mysql, a statement can't run while an unbuffered cursor has unread rows.
+    '''
+    def __init__(self, respond=None, description=None, host='fakehost', database='testdb', **conn_args):
+        self.respond = respond or (lambda sql, values: [])
+        self.description = description
+        self.host = host
+        self.db = database.encode()
+        self.executed = []
+        self.cursors = []
+        self.streaming = None
+        self.pings = 0
+        self.closed = False
+
+    def cursor(self, cursor=None):
+        assert cursor in (None, pymysql.cursors.Cursor, pymysql.cursors.SSCursor)
+        self.cursors.append(FakeCursor(self, unbuffered=cursor is pymysql.cursors.SSCursor))
+        return self.cursors[-1]
+
+    def commit(self):
+        pass
+
+    def ping(self, reconnect=False, **kwargs):
+        self.pings += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_mysql():
+    '''
+    fake_mysql(respond=None, description=None) returns a connect(**conn_args) that makes FakeConns,
+    eg for MySQLPool(connect=...); call it with no arguments for a single connection.
+    '''
+    def connector(respond=None, description=None):
+        def connect(**conn_args):
+            return FakeConn(respond, description, **conn_args)
+        return connect
+    return connector
@@ -0,0 +1,55 @@
+import os
+from pbutils.file_index import FileIndex, changed_since, hash_file
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def changes(index, root):
+    return sorted((c.path, c.status) for c in changed_since(index, root))
+
+
+def test_changed_since(tmp_path):
+    root = str(tmp_path / 'data')
+    a, b, c = (os.path.join(root, name) for name in ('a.txt', 'sub/b.txt', 'sub/c.txt'))
+    write(a, 'a')
+    write(b, 'b')
+    db_path = str(tmp_path / 'index.db')
+
+    assert changes(db_path, root) == [(a, 'added'), (b, 'added')]
+    assert changes(db_path, root) == []
+
+    write(a, 'aa')
+    write(c, 'c')
+    os.unlink(b)
+    with FileIndex(db_path) as index:
+        assert changes(index, root) == [(a, 'modified'), (b, 'deleted'), (c, 'added')]
+        assert index.get(a).digest == hash_file(a)
+        assert index.get(b) is None
+
+        # touched, same content: not reported, but stat data is refreshed
+        os.utime(c, ns=(0, 0))
+        assert changes(index, root) == []
+        assert index.get(c).mtime_ns == 0
+
+
+def test_stop_early(tmp_path, monkeypatch):
+    ''' a caller that stops iterating doesn't pay for hashing every remaining file '''
+    from pbutils import file_index
+    root = str(tmp_path / 'data')
+    for i in range(200):
+        write(os.path.join(root, F'{i}.txt'), str(i))
+    hashed = []
+    real_hash = file_index.hash_file
+    monkeypatch.setattr(file_index, 'hash_file', lambda path, *args: hashed.append(path) or real_hash(path, *args))
+
+    db_path = str(tmp_path / 'index.db')
+    changes = changed_since(db_path, root, n_threads=2)
+    first = next(changes)
+    changes.close()
+    assert len(hashed) <= 2 * 4 + 1
+    assert sum(1 for change in changed_since(db_path, root) if change.status == 'added') == 199
+    assert first.status == 'added'
@@ -0,0 +1,49 @@
+import os
+from pbutils.files import scan_sizes, size_report, format_size
+
+
+def write(path, n_bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * n_bytes)
+
+
+def make_tree(root):
+    write(os.path.join(root, 'a.txt'), 10)
+    write(os.path.join(root, 'sub1', 'b.txt'), 100)
+    write(os.path.join(root, 'sub1', 'c.txt'), 1000)
+    write(os.path.join(root, 'sub1', 'deeper', 'd.txt'), 5)
+    write(os.path.join(root, 'sub2', 'e.txt'), 1)
+
+
+def test_scan_sizes(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+    usages = scan_sizes(root, n_threads=3)
+
+    assert usages[root].total_size == 1116
+    assert usages[root].own_size == 10
+    assert usages[os.path.join(root, 'sub1')].total_size == 1105
+    assert usages[os.path.join(root, 'sub1')].n_files == 2
+    assert usages[os.path.join(root, 'sub1', 'deeper')].total_size == 5
+    assert usages[os.path.join(root, 'sub2')].total_size == 1
+
+    report = dict(size_report(usages, units='bytes'))
+    assert report[root] == format_size(1116, 'bytes') == '1116.0Bytes'
+
+
+def test_incremental(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+    first = scan_sizes(root)
+
+    write(os.path.join(root, 'sub2', 'f.txt'), 50)
+    second = scan_sizes(root, previous=first)
+    assert second[os.path.join(root, 'sub2')].total_size == 51
+    assert second[root].total_size == 1166
+
+    # unchanged directories reuse previous results, even if stale:
+    sub1 = os.path.join(root, 'sub1')
+    second[sub1] = second[sub1]._replace(own_size=0)
+    third = scan_sizes(root, previous=second)
+    assert third[sub1].total_size == 5
@@ -0,0 +1,78 @@
+import os
+import pytest
+from pbutils import files
+from pbutils.files import atomic_write, atomic_open, AtomicWriter, BulkWriter
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_atomic_write(tmp_path):
+    path = str(tmp_path / 'out.txt')
+    atomic_write(path, 'hello')
+    assert read(path) == 'hello'
+    atomic_write(path, b'bytes', fsync=True)
+    assert read(path) == 'bytes'
+    assert os.listdir(str(tmp_path)) == ['out.txt']
+
+
+@pytest.mark.parametrize('read_proc', [True, False])
+def test_new_file_mode(tmp_path, monkeypatch, read_proc):
+    monkeypatch.setattr(files, '_umask', None)
+    if not read_proc:
+        monkeypatch.setattr(files, '_read_proc_umask', lambda: None)
+    old_umask = os.umask(0o027)
+    try:
+        atomic_write(str(tmp_path / 'new.txt'), 'hello')
+    finally:
+        os.umask(old_umask)
+    assert os.stat(str(tmp_path / 'new.txt')).st_mode & 0o777 == 0o640
+
+
+def test_atomic_open_failure(tmp_path):
+    path = str(tmp_path / 'out.txt')
+    atomic_write(path, 'original')
+    with pytest.raises(RuntimeError):
+        with atomic_open(path) as f:
+            f.write('partial')
+            raise RuntimeError('oops')
+    assert read(path) == 'original'
+    assert os.listdir(str(tmp_path)) == ['out.txt']
+
+
+def test_atomic_writer_batches(tmp_path):
+    paths = [str(tmp_path / F'{i}.txt') for i in range(5)]
+    with AtomicWriter(fsync=True, batch_size=3) as writer:
+        for i, path in enumerate(paths):
+            writer.write(path, str(i))
+        assert len(writer.pending) == 2
+        assert not os.path.exists(paths[4])
+    assert [read(path) for path in paths] == [str(i) for i in range(5)]
+    assert sorted(os.listdir(str(tmp_path))) == sorted(os.path.basename(p) for p in paths)
+
+
+def test_bulk_writer(tmp_path):
+    paths = [str(tmp_path / F'{i}.txt') for i in range(200)]
+    with BulkWriter(n_threads=4, max_pending=8) as writer:
+        for i, path in enumerate(paths):
+            writer.write(path, str(i))
+    assert writer.n_written == 200
+    assert [read(path) for path in paths] == [str(i) for i in range(200)]
+
+
+def test_bulk_writer_errors(tmp_path):
+    writer = BulkWriter()
+    writer.write(str(tmp_path / 'ok.txt'), 'ok')
+    writer.write(str(tmp_path / 'missing' / 'bad.txt'), 'bad')
+    with pytest.raises(IOError):
+        writer.close()
+
+
+def test_bulk_writer_errors_keep_exception(tmp_path, caplog):
+    with pytest.raises(KeyError):
+        with BulkWriter() as writer:
+            writer.write(str(tmp_path / 'missing' / 'bad.txt'), 'bad')
+            raise KeyError('original')
+    assert '1 of 1 writes failed' in caplog.text
@@ -0,0 +1,39 @@
+import io
+import datetime
+import pytest
+import unittest
+import pkg_resources as pr
+
+from pbutils.mysql_utils import tsv_escape, write_tsv, bulk_load, get_mysql, get_cursor
+from pbutils.configs import get_config
+
+
+def test_tsv_escape():
+    assert tsv_escape(None) == '\\N'
+    assert tsv_escape(True) == '1'
+    assert tsv_escape(3.5) == '3.5'
+    assert tsv_escape('a\tb\\c\nd\re\0') == 'a\\tb\\\\c\\nd\\re\\0'
+    assert tsv_escape(b'bytes') == 'bytes'
+    assert tsv_escape(datetime.datetime(2020, 1, 2, 3, 4, 5)) == '2020-01-02 03:04:05'
+
+
+def test_write_tsv():
+    stream = io.StringIO()
+    n_rows = write_tsv(stream, [(1, 'a'), {'name': 'b\tc', 'id': 2}, (3, None)], ['id', 'name'])
+    assert n_rows == 3
+    assert stream.getvalue() == '1\ta\n2\tb\\tc\n3\t\\N\n'
+
+
+@pytest.mark.skip('Mysql not always installed')
+class TestBulkLoad(unittest.TestCase):
+    def test_bulk_load(self):
+        config = get_config(pr.resource_filename('pbutils', 'tests/fixtures/mysql.ini'))
+        dbh = get_mysql(local_infile=True, **dict(config.items('mysql')))
+        with get_cursor(dbh) as cursor:
+            cursor.execute('DROP TABLE IF EXISTS bench_bulk_load')
+            cursor.execute('CREATE TABLE bench_bulk_load (id INT PRIMARY KEY, name VARCHAR(32))')
+
+        rows = ((i, F'name\t{i}') for i in range(100000))
+        stats = bulk_load(dbh, 'bench_bulk_load', rows, ['id', 'name'], disable_keys=True, lock=True)
+        print(F"bulk_load: {stats.rows_per_sec:.0f} rows/sec")
+        self.assertEqual(stats.n_rows, 100000)
@@ -0,0 +1,109 @@
+import os
+import pytest
+import unittest
+import threading
+import pkg_resources as pr
+
+from pbutils import mysql_utils
+from pbutils.mysql_utils import MySQLPool, copy_table, save_objs
+from pbutils.configs import get_config
+
+
+@pytest.mark.skip('Mysql not always installed')
+class TestCopyTable(unittest.TestCase):
+    def setUp(self):
+        config = get_config(pr.resource_filename('pbutils', 'tests/fixtures/mysql.ini'))
+        self.src = MySQLPool.from_config(config, 'mysql', max_size=4)
+        self.dst = MySQLPool.from_config(config, 'mysql', min_size=0, max_size=4)   # no connection yet
+        with self.src.cursor() as cursor:
+            cursor.execute('CREATE DATABASE IF NOT EXISTS pbutils_test_copy')
+            for db_name in ('pbutils_test', 'pbutils_test_copy'):
+                cursor.execute(F'DROP TABLE IF EXISTS {db_name}.copy_me')
+                cursor.execute(F'CREATE TABLE {db_name}.copy_me (id INT PRIMARY KEY, name VARCHAR(32))')
+        with self.src.connection() as dbh:
+            save_objs(dbh, ({'id': i, 'name': F'n{i}'} for i in range(1, 10001)), 'copy_me')
+        self.dst.conn_args['database'] = 'pbutils_test_copy'
+
+    def test_copy_table(self):
+        checkpoint_path = '/tmp/copy_me.checkpoint'
+        stats = copy_table(self.src, self.dst, 'copy_me', workers=4, chunk_size=1000,
+                           checkpoint_path=checkpoint_path)
+        self.assertEqual(stats.n_rows, 10000)
+        self.assertEqual(stats.n_chunks, 10)
+        self.assertFalse(os.path.exists(checkpoint_path))
+        with self.dst.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM copy_me')
+            self.assertEqual(cursor.fetchone()[0], 10000)
+
+
+class FakeDB:
+    ''' just enough sql for copy_table(): MIN/MAX, key stepping, range selects and multi-row upserts '''
+    def __init__(self, rows=()):
+        self.rows = {row[0]: row for row in rows}
+        self.lock = threading.Lock()
+        self.fail_at = None
+
+    def respond(self, sql, values):
+        keys = sorted(self.rows)
+        if sql.startswith('SELECT MIN'):
+            return [(keys[0], keys[-1]) if keys else (None, None)]
+        elif 'OFFSET' in sql:
+            start, offset = values
+            after = [key for key in keys if key >= start]
+            return [(after[offset],)] if offset < len(after) else []
+        elif sql.startswith('SELECT'):
+            start, stop = values
+            return [self.rows[key] for key in keys if start <= key < stop]
+        elif sql.startswith('INSERT'):
+            with self.lock:
+                if self.fail_at is not None and self.fail_at in values[::2]:
+                    self.fail_at = None
+                    raise RuntimeError('lost the destination')
+                for i in range(0, len(values), 2):
+                    self.rows[values[i]] = tuple(values[i:i + 2])
+            return len(values) // 2
+        raise AssertionError(sql)
+
+
+@pytest.fixture
+def fake_dbs(monkeypatch):
+    monkeypatch.setattr(mysql_utils, 'get_field_info',
+                        lambda dbh, tablename: (['id', 'name'], {'id': {'py_type': int}, 'name': {'py_type': str}}, 'id'))
+    monkeypatch.setattr(mysql_utils, 'get_database', lambda dbh: 'src')
+    keys = list(range(1, 2001)) + [10 ** 15 + i for i in range(500)]      # sparse bigint keys
+    return {'src': FakeDB((key, F'n{key}') for key in keys), 'dst': FakeDB()}
+
+
+@pytest.fixture
+def make_pool(fake_mysql, fake_dbs):
+    def make(database):
+        connect = fake_mysql(fake_dbs[database].respond, description=[('id',), ('name',)])
+        return MySQLPool('host', database, 'user', 'pw', min_size=0, max_size=3, connect=connect)
+    return make
+
+
+def test_copy_chunks(fake_dbs, make_pool):
+    stats = copy_table(make_pool('src'), make_pool('dst'), 'things', workers=3, chunk_size=300, batch_size=100)
+    assert (stats.n_rows, stats.n_chunks, stats.n_skipped) == (2500, 9, 0)
+    assert fake_dbs['dst'].rows == fake_dbs['src'].rows
+
+
+@pytest.mark.parametrize('deleted', [None, 1300])
+def test_checkpoint_resume(fake_dbs, make_pool, tmp_path, deleted):
+    checkpoint_path = str(tmp_path / 'things.checkpoint')
+    fake_dbs['dst'].fail_at = 1501         # starts the 6th chunk, (1501, 1801)
+    with pytest.raises(RuntimeError):
+        copy_table(make_pool('src'), make_pool('dst'), 'things', workers=1, chunk_size=300,
+                   checkpoint_path=checkpoint_path)
+    assert os.path.exists(checkpoint_path)
+    if deleted is not None:
+        # the source changes between calls, so the 5th chunk becomes (1201, 1502), wider than was copied
+        # (copy_table doesn't propagate deletes, hence the one from dst):
+        del fake_dbs['src'].rows[deleted]
+        del fake_dbs['dst'].rows[deleted]
+
+    stats = copy_table(make_pool('src'), make_pool('dst'), 'things', workers=1, chunk_size=300,
+                       checkpoint_path=checkpoint_path)
+    assert stats.n_skipped >= (5 if deleted is None else 4) and stats.n_chunks + stats.n_skipped == 9
+    assert fake_dbs['dst'].rows == fake_dbs['src'].rows
+    assert not os.path.exists(checkpoint_path)
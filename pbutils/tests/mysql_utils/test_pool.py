@@ -0,0 +1,67 @@
+'''
+MySQLPool bookkeeping, on fake connections (no mysql server needed).
+'''
+import threading
+import pytest
+from pymysql.err import OperationalError
+
+from pbutils.mysql_utils import MySQLPool, PoolExhausted
+
+
+def make_pool(connect, **kwargs):
+    return MySQLPool('host', 'db', 'user', 'pw', connect=connect, **kwargs)
+
+
+def test_reentrant_checkout(fake_mysql):
+    pool = make_pool(fake_mysql(), min_size=1, max_size=2)
+    with pool.connection() as dbh1:
+        with pool.connection() as dbh2:
+            assert dbh1 is dbh2
+        assert pool.stats == {'open': 1, 'idle': 0, 'in_use': 1}
+    assert pool.stats == {'open': 1, 'idle': 1, 'in_use': 0}
+
+
+def test_exhausted(fake_mysql):
+    pool = make_pool(fake_mysql(), min_size=0, max_size=1, checkout_timeout=0.05)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    with pytest.raises(PoolExhausted):
+        with pool.connection():
+            pass
+    release.set()
+    thread.join()
+    with pool.connection():
+        pass
+
+
+def test_retry_transient(fake_mysql):
+    failures = [2]
+
+    def respond(sql, values):
+        if failures[0]:
+            failures[0] -= 1
+            raise OperationalError(2013, 'Lost connection to MySQL server during query')
+        return [(1,)]
+    pool = make_pool(fake_mysql(respond), min_size=1, max_size=2, retries=2)
+    assert pool.execute('SELECT 1', fetch=True) == [(1,)]
+    assert pool.stats['open'] == 1       # broken connections were discarded
+
+
+def test_health_check_and_idle_timeout(fake_mysql):
+    pool = make_pool(fake_mysql(), min_size=1, max_size=3, health_check_interval=0, idle_timeout=0)
+    with pool.connection() as dbh1:
+        with pool.connection():
+            pass
+    assert dbh1.pings == 1
+    assert pool.stats['open'] == 1
+    pool.close()
+    assert dbh1.closed
@@ -0,0 +1,54 @@
+import time
+import pytest
+import unittest
+import pkg_resources as pr
+
+from pbutils.mysql_utils import (get_mysql, get_cursor, build_upsert_sql, build_multi_upsert_sql,
+                                 save_obj, save_objs)
+from pbutils.configs import get_config
+
+
+def test_build_multi_upsert_sql():
+    records = [{'id': 1, 'name': 'a', 'n': 10}, {'id': 2, 'name': 'b', 'n': 20}]
+    sql, values = build_multi_upsert_sql(records, 'things', primary_key='id')
+    assert sql == 'INSERT INTO things (id, name, n) VALUES (%s, %s, %s), (%s, %s, %s)' \
+        ' ON DUPLICATE KEY UPDATE name=VALUES(name), n=VALUES(n)'
+    assert values == [1, 'a', 10, 2, 'b', 20]
+
+    sql, values = build_multi_upsert_sql(records[:1], 'things')
+    assert sql == 'INSERT INTO things (id, name, n) VALUES (%s, %s, %s)'
+
+
+def test_build_upsert_sql():
+    sql, values = build_upsert_sql({'id': 1, 'name': 'a'}, 'things', primary_key='id')
+    assert sql == 'INSERT INTO things (id, name) VALUES (%s, %s) ON DUPLICATE KEY UPDATE name=%s'
+    assert values == [1, 'a', 'a']
+
+
+@pytest.mark.skip('Mysql not always installed')
+class TestSaveObjsBenchmark(unittest.TestCase):
+    ''' compare rows/sec of save_obj() and save_objs() '''
+    n_rows = 20000
+
+    def setUp(self):
+        config = get_config(pr.resource_filename('pbutils', 'tests/fixtures/mysql.ini'))
+        self.dbh = get_mysql(**dict(config.items('mysql')))
+        with get_cursor(self.dbh) as cursor:
+            cursor.execute('DROP TABLE IF EXISTS bench_save_objs')
+            cursor.execute('CREATE TABLE bench_save_objs (id INT PRIMARY KEY, name VARCHAR(32), n INT)')
+
+    def test_throughput(self):
+        records = [{'id': i, 'name': F'name{i}', 'n': i} for i in range(self.n_rows)]
+
+        t0 = time.time()
+        for record in records[:self.n_rows // 10]:
+            save_obj(self.dbh, record, 'bench_save_objs', primary_key='id')
+        single_rate = (self.n_rows // 10) / (time.time() - t0)
+
+        t0 = time.time()
+        n_affected = save_objs(self.dbh, records, 'bench_save_objs', primary_key='id', batch_size=1000)
+        batch_rate = self.n_rows / (time.time() - t0)
+
+        print(F"save_obj: {single_rate:.0f} rows/sec; save_objs: {batch_rate:.0f} rows/sec")
+        self.assertGreater(n_affected, 0)
+        self.assertGreater(batch_rate, single_rate)
@@ -0,0 +1,54 @@
+'''
+Schema cache behaviour, on a fake connection.
+'''
+import pytest
+
+from pbutils.mysql_utils import SchemaCache, get_field_info, invalidate_schema, table_exists
+
+
+def respond(sql, values):
+    if sql.startswith('SHOW COLUMNS'):
+        return [('id', 'int(11)', 'NO', 'PRI', None, 'auto_increment'),
+                ('name', 'varchar(32)', 'YES', '', None, '')]
+    return [(1,)] if values == ('testdb', 'things') else []
+
+
+@pytest.fixture
+def dbh(fake_mysql):
+    return fake_mysql(respond)()
+
+
+def test_invalidate():
+    cache = SchemaCache()
+    for key in [('h', 'db1', None), ('h', 'db1', 't1'), ('h', 'db1', 't2'), ('h', 'db2', 't1')]:
+        cache.get(key, lambda: 'x')
+    cache.invalidate('h', 'db1', 't1')
+    assert set(cache.entries) == {('h', 'db1', 't2'), ('h', 'db2', 't1')}
+    cache.invalidate(database='db2')
+    assert set(cache.entries) == {('h', 'db1', 't2')}
+
+
+def test_field_info_cached(dbh):
+    invalidate_schema(dbh)
+    fields, info, pk = get_field_info(dbh, 'things')
+    assert fields == ['id', 'name']
+    assert pk == 'id'
+    assert info['id']['py_type'] is int
+    info['id']['py_type'] = None      # mutating the result doesn't touch the cache
+
+    fields, info, pk = get_field_info(dbh, 'things')
+    assert info['id']['py_type'] is int
+    assert len(dbh.executed) == 1
+
+    invalidate_schema(dbh, 'things')
+    get_field_info(dbh, 'things')
+    assert len(dbh.executed) == 2
+    invalidate_schema(dbh)
+
+
+def test_table_exists(dbh):
+    invalidate_schema(dbh)
+    assert table_exists(dbh, 'things')
+    assert table_exists(dbh, 'testdb.things')
+    assert not table_exists(dbh, 'otherdb.things')
+    assert 'information_schema' in dbh.executed[0]
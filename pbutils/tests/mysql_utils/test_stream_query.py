@@ -0,0 +1,57 @@
+'''
+stream_query() batching and row shapes, on fake connections.
+'''
+import pytest
+
+from pbutils.mysql_utils import stream_query, MySQLPool
+
+
+def respond(sql, values):
+    return [(i, F'n{i}') for i in range(5)] if sql == 'SELECT' else 1
+
+
+@pytest.fixture
+def connect(fake_mysql):
+    return fake_mysql(respond, description=[('id',), ('name',)])
+
+
+def test_row_types(connect):
+    dbh = connect()
+    assert list(stream_query(dbh, 'SELECT', batch_size=2)) == [(i, F'n{i}') for i in range(5)]
+    assert dbh.cursors[-1].fetch_sizes == [2, 2, 2, 2]
+    assert dbh.cursors[-1].closed
+
+    assert next(stream_query(dbh, 'SELECT', row_type='dict')) == {'id': 0, 'name': 'n0'}
+    row = next(stream_query(dbh, 'SELECT', row_type='namedtuple'))
+    assert (row.id, row.name) == (0, 'n0')
+
+    chunks = list(stream_query(dbh, 'SELECT', batch_size=3, row_type='columns'))
+    assert [list(chunk['id']) for chunk in chunks] == [[0, 1, 2], [3, 4]]
+
+
+def test_abandoned_generator_releases(connect):
+    pool = MySQLPool('host', 'db', 'user', 'pw', min_size=1, max_size=1, connect=connect)
+    rows = stream_query(pool, 'SELECT', batch_size=2)
+    next(rows)
+    assert pool.stats['in_use'] == 1
+    rows.close()
+    assert pool.stats['in_use'] == 0
+    with pool.connection() as dbh:
+        assert dbh.cursors[-1].closed
+
+
+def test_pool_usable_while_streaming(connect):
+    pool = MySQLPool('host', 'db', 'user', 'pw', min_size=1, max_size=2, connect=connect)
+    rows = []
+    for row in stream_query(pool, 'SELECT', batch_size=2):
+        rows.append(row)
+        pool.execute('INSERT', (row[0],))
+    assert len(rows) == 5
+    assert pool.stats == {'open': 2, 'idle': 2, 'in_use': 0}
+    writer, streamer = sorted((dbh for dbh, _ in pool.idle), key=lambda dbh: dbh.executed[0])
+    assert (streamer.executed, writer.executed) == (['SELECT'], ['INSERT'] * 5)
+
+
+def test_bad_row_type(connect):
+    with pytest.raises(ValueError):
+        next(stream_query(connect(), 'SELECT', row_type='xml'))
@@ -0,0 +1,63 @@
+import random
+import pytest
+
+from pbutils import span_mixin
+from pbutils.span_mixin import SpanMixin, SpanSet
+
+
+def test_from_to_spans():
+    spans = [SpanMixin(10, 5), SpanMixin(1, 3)]
+    span_set = SpanSet.from_spans(spans)
+    assert list(span_set) == [(1, 3), (5, 10)]
+    assert span_set.to_spans() == [SpanMixin(1, 3), SpanMixin(5, 10)]
+
+
+def test_merged():
+    span_set = SpanSet.from_spans([(23, 34), (43, 48), (48, 52), (51, 59), (62, 67), (25, 26)])
+    assert list(span_set.merged()) == [(23, 34), (43, 59), (62, 67)]
+
+
+def test_overlaps():
+    span_set = SpanSet.from_spans([(1, 5), (5, 10), (11, 12), (18, 22), (23, 38), (9, 21)])
+    other = SpanSet.from_spans([(10, 20)])
+    expected = [SpanMixin(*span).overlap(SpanMixin(10, 20)) for span in span_set]
+    assert span_set.overlaps(other) == expected
+
+
+def test_set_operations():
+    a = SpanSet.from_spans([(1, 10), (20, 30), (40, 50)])
+    b = SpanSet.from_spans([(5, 25), (45, 60)])
+    assert list(a.intersection(b)) == [(5, 10), (20, 25), (45, 50)]
+    assert list(a.union(b)) == [(1, 30), (40, 60)]
+    assert list(a.subtract(b)) == [(1, 5), (25, 30), (40, 45)]
+    assert list(b.subtract(a)) == [(10, 20), (50, 60)]
+    assert list(a.subtract(SpanSet.from_spans([(0, 100)]))) == []
+    assert list(SpanSet.from_spans([(1, 20)]).subtract(SpanSet.from_spans([(5, 10)]))) == [(1, 5), (10, 20)]
+
+
+def test_coverage():
+    span_set = SpanSet.from_spans([(1, 5), (4, 8), (10, 12)])
+    assert span_set.coverage() == 9
+    assert SpanSet().coverage() == 0
+
+
+def random_spans(rng, n):
+    return [(rng.randint(0, 200), rng.randint(0, 200)) for _ in range(n)] + [(5, 5), (300, 300)]
+
+
+@pytest.mark.skipif(not span_mixin.HAS_NUMPY, reason='numpy not installed')
+def test_numpy_matches_loops(monkeypatch):
+    rng = random.Random(17)
+    cases = [(random_spans(rng, rng.randint(0, 30)), random_spans(rng, rng.randint(0, 30))) for _ in range(50)]
+    cases += [([], [(1, 2)]), ([(1, 2)], []), ([], [])]
+
+    def run():
+        answers = []
+        for a_spans, b_spans in cases:
+            a, b = SpanSet.from_spans(a_spans), SpanSet.from_spans(b_spans)
+            answers.append([list(x) for x in (a, a.merged(), a.intersection(b), a.union(b), a.subtract(b))])
+        return answers
+
+    vectorized = run()
+    monkeypatch.setattr(span_mixin, 'HAS_NUMPY', False)
+    assert vectorized == run()
@@ -0,0 +1,58 @@
+import io
+import json
+import logging
+import sqlalchemy as sa
+
+from pbutils import sql_timing
+from pbutils.sql_timing import SqlStats, add_hook, remove_hook, fingerprint
+from pbutils.sqla_core import SimpleStore
+from pbutils.mysql_utils import do_sql
+
+
+def test_fingerprint():
+    assert fingerprint("SELECT * FROM t1 WHERE id = 12 AND name='bob'") == \
+        fingerprint("select *   from t1\nwhere id = 7 and name='al''s'") == \
+        "select * from t1 where id = ? and name=?"
+    assert fingerprint('SELECT * FROM t WHERE id IN (1, 2, 3)') == 'select * from t where id in (?+)'
+    assert fingerprint('INSERT INTO t (a, b) VALUES (%s, %s)') == 'insert into t (a, b) values (?+)'
+
+
+def test_simple_store_stats():
+    engine = sa.create_engine('sqlite://')
+    meta = sa.MetaData()
+    table = sa.Table('things', meta, sa.Column('id', sa.Integer, primary_key=True), sa.Column('name', sa.String))
+    meta.create_all(engine)
+    store = SimpleStore(engine.connect(), table)
+
+    stats = add_hook(SqlStats(slow_threshold=None))
+    try:
+        for i in range(3):
+            store.insert({'name': F'n{i}'})
+        store.get_pk(1)
+    finally:
+        remove_hook(stats)
+    store.get_pk(2)             # not recorded
+
+    result = stats.to_dict()['statements']
+    inserts = [v for k, v in result.items() if k.startswith('insert')]
+    selects = [v for k, v in result.items() if k.startswith('select')]
+    assert len(inserts) == 1 and inserts[0]['count'] == 3 and inserts[0]['rows'] == 3
+    assert len(selects) == 1 and selects[0]['count'] == 1
+    assert sum(inserts[0]['histogram_us'].values()) == 3
+
+    stream = io.StringIO()
+    stats.dump(stream)
+    assert json.loads(stream.getvalue())['statements']
+
+
+def test_do_sql_slow_log(caplog, fake_mysql):
+    cursor = fake_mysql(lambda sql, values: 5)().cursor()
+    stats = add_hook(SqlStats(slow_threshold=0.0))
+    try:
+        with caplog.at_level(logging.WARNING, logger='pbutils.sql_timing'):
+            do_sql(cursor, 'DELETE FROM t WHERE id=%s', (3,))
+    finally:
+        remove_hook(stats)
+    assert stats.statements['delete from t where id=%s'].rows == 5
+    assert 'slow query' in caplog.text
+    assert sql_timing.hooks == []
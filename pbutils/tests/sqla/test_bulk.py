@@ -0,0 +1,87 @@
+import time
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from pbutils.sqla import bulk_save, bulk_upsert
+
+OrmBase = declarative_base()
+
+
+class Thing(OrmBase):
+    __tablename__ = 'things'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(32))
+    n = sa.Column(sa.Integer)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = sa.create_engine(F"sqlite:///{tmp_path / 'bulk.db'}")
+    OrmBase.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def count(session_factory, **where):
+    session = session_factory()
+    try:
+        return session.query(Thing).filter_by(**where).count()
+    finally:
+        session.close()
+
+
+def test_bulk_save(session_factory):
+    stats = bulk_save(session_factory, (Thing(id=i, name=F'n{i}', n=i % 2) for i in range(2500)), batch_size=1000)
+    assert (stats.n_objects, stats.n_batches) == (2500, 3)
+    assert stats.objects_per_sec > 0
+
+    stats = bulk_save(session_factory, ({'id': i, 'name': 'm', 'n': 5} for i in range(2500, 2600)), mapper=Thing)
+    assert (stats.n_objects, stats.n_batches) == (100, 1)
+    assert count(session_factory) == 2600
+    assert count(session_factory, n=5) == 100
+
+
+def test_bulk_save_rolls_back(session_factory):
+    things = [{'id': i, 'name': 'x'} for i in range(10)] + [{'id': 3, 'name': 'dup'}]
+    with pytest.raises(sa.exc.IntegrityError):
+        bulk_save(session_factory, things, batch_size=4, mapper=Thing)
+    assert count(session_factory) == 0
+
+
+def test_bulk_upsert(session_factory):
+    bulk_save(session_factory, [{'id': i, 'name': 'old', 'n': 0} for i in range(10)], mapper=Thing)
+    stats = bulk_upsert(session_factory, Thing, [{'id': i, 'name': 'new', 'n': 1} for i in range(5, 15)], batch_size=3)
+    assert (stats.n_objects, stats.n_batches) == (10, 4)
+    assert (count(session_factory, name='old'), count(session_factory, name='new')) == (5, 10)
+
+    bulk_upsert(session_factory, Thing.__table__, [{'id': 0, 'name': 'table'}])
+    assert count(session_factory, name='table') == 1
+
+
+def test_bulk_upsert_rolls_back(session_factory):
+    ''' the upserts run in the session's transaction, so a failure part way undoes them all '''
+    def rows():
+        yield from ({'id': i, 'name': 'x'} for i in range(5))
+        raise ValueError('bad row')
+
+    with pytest.raises(ValueError):
+        bulk_upsert(session_factory, Thing, rows(), batch_size=2)
+    assert count(session_factory) == 0
+
+
+def test_benchmark(session_factory):
+    ''' bulk_save() vs session.add() in a loop '''
+    n = 5000
+    t0 = time.time()
+    session = session_factory()
+    for i in range(n):
+        session.add(Thing(id=i, name='loop', n=i))
+    session.commit()
+    session.close()
+    loop_secs = time.time() - t0
+
+    stats = bulk_save(session_factory, ({'id': i, 'name': 'bulk', 'n': i} for i in range(n, 2 * n)), mapper=Thing)
+    print(F"\nsession.add: {n / loop_secs:.0f} objects/s, bulk_save: {stats.objects_per_sec:.0f} objects/s")
+    assert stats.seconds < loop_secs
@@ -0,0 +1,79 @@
+import threading
+import pytest
+import sqlalchemy as sa
+
+from pbutils.sqla import make_engine, get_engine, pool_metrics, engine_args_from_config, engines, get_session, sessions
+from pbutils.configs import get_config_from_data
+from pbutils.sql_timing import SqlStats, add_hook, remove_hook
+from sqlalchemy.orm import sessionmaker
+
+
+def test_engine_args_from_config():
+    config = get_config_from_data('''[db]
+host=localhost
+database=pbutils_test
+pool_size=20
+max_overflow=5
+pool_recycle=3600
+pool_pre_ping=false
+pool_timeout=2.5
+''', 'Raw')
+    assert engine_args_from_config(config, 'db') == {
+        'pool_size': 20, 'max_overflow': 5, 'pool_recycle': 3600, 'pool_pre_ping': False, 'pool_timeout': 2.5}
+
+
+@pytest.fixture
+def named_engines(tmp_path):
+    yield [make_engine(F"sqlite:///{tmp_path / name}.db", name=name, pool_size=1, max_overflow=0,
+                       pool_timeout=0.2, pool_pre_ping=True, connect_args={"check_same_thread": False})
+           for name in ('first', 'second')]
+    for name in ('first', 'second'):
+        engines.pop(name).dispose()
+
+
+def test_named_engines(named_engines):
+    first, second = named_engines
+    assert get_engine('first') is first and get_engine('second') is second
+    assert first.pool.size() == 1
+    sessions['second'] = sessionmaker(bind=second)
+    with get_session('second') as session:
+        assert session.execute(sa.text('SELECT 1')).scalar() == 1
+    sessions.pop('second')
+
+
+def test_pool_metrics(named_engines):
+    first, _ = named_engines
+    stats = add_hook(SqlStats())
+    try:
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with first.connect():
+                holding.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        holding.wait()
+        assert pool_metrics('first')['in_use'] == 1
+        with pytest.raises(sa.exc.TimeoutError):
+            first.connect()
+        threading.Timer(0.05, release.set).start()
+        with first.connect() as conn:           # waits for hold() to give its connection back
+            conn.execute(sa.text('SELECT 1'))
+        thread.join()
+    finally:
+        remove_hook(stats)
+
+    metrics = pool_metrics()['first']
+    assert (metrics['size'], metrics['checked_out'], metrics['in_use'], metrics['max_in_use']) == (1, 0, 0, 1)
+    assert metrics['timeouts'] == 1
+    assert metrics['checkout_wait']['count'] == 3
+    assert metrics['checkout_wait']['max_secs'] >= 0.15
+    assert stats.to_dict()['waits']['pool:first']['count'] == 3
+
+    first.dispose()             # metrics survive the pool being recreated
+    with first.connect():
+        pass
+    assert pool_metrics('first')['checkout_wait']['count'] == 4
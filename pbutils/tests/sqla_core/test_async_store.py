@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+import sqlalchemy as sa
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('sqlalchemy.ext.asyncio')
+
+from pbutils.sqla_async import init_async_sqla, AsyncSimpleStore  # noqa: E402
+
+
+def make_table():
+    metadata = sa.MetaData()
+    table = sa.Table('things', metadata,
+                     sa.Column('id', sa.Integer, primary_key=True),
+                     sa.Column('name', sa.String(50)),
+                     sa.Column('n', sa.Integer))
+    return metadata, table
+
+
+async def _crud(db_url):
+    metadata, table = make_table()
+    engine = await init_async_sqla(db_url, metadata)
+    try:
+        store = AsyncSimpleStore(engine, table, max_concurrency=4)
+        assert [col.name for col in store.primary_keys] == ['id']
+
+        await store.insert_many([{'id': i, 'name': F'n{i}', 'n': i % 3} for i in range(1, 101)])
+        await store.insert({'id': 101, 'name': 'extra', 'n': 0})
+        assert (await store.get_pk(7))['name'] == 'n7'
+        assert await store.get_pk(999) is None
+        assert len(await store.get(n=1)) == 34
+
+        found = await store.get_many([1, 2, 500])
+        assert sorted(found) == [1, 2]
+
+        assert await store.update(2, {'name': 'two'}) == 1
+        await store.upsert_many([{'id': 3, 'name': 'three', 'n': 3}, {'id': 200, 'name': 'new', 'n': 3}])
+        await store.update_many([{'id': 4, 'name': 'four'}])
+        rows = await store.get(n=3)
+        assert sorted(row['name'] for row in rows) == ['new', 'three']
+        assert (await store.get_pk(4))['name'] == 'four'
+
+        assert await store.delete(n=0) == 33     # id 3 now has n=3
+        assert len(await store.iter(batch_size=7)) == 102 - 33
+
+        await store.clear()
+        assert await store.get() == []
+    finally:
+        await engine.dispose()
+
+
+async def _concurrent(db_url):
+    metadata, table = make_table()
+    engine = await init_async_sqla(db_url, metadata)
+    try:
+        store = AsyncSimpleStore(engine, table, max_concurrency=3)
+        batches = [[{'id': b * 10 + i, 'name': 'x', 'n': b} for i in range(10)] for b in range(20)]
+        await asyncio.gather(*(store.insert_many(batch) for batch in batches))
+        assert len(await store.iter()) == 200
+        pks = await asyncio.gather(*(store.get_pk(pk) for pk in range(0, 200, 10)))
+        assert [row['n'] for row in pks] == list(range(20))
+        assert store.cache_stats()['hits'] > 0
+    finally:
+        await engine.dispose()
+
+
+def test_crud(tmp_path):
+    asyncio.run(_crud(F"sqlite+aiosqlite:///{tmp_path / 'crud.db'}"))
+
+
+def test_concurrent(tmp_path):
+    asyncio.run(_concurrent(F"sqlite+aiosqlite:///{tmp_path / 'concurrent.db'}"))
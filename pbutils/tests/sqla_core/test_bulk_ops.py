@@ -0,0 +1,75 @@
+import time
+import sqlalchemy as sa
+from pbutils.sqla_core import SimpleStore
+
+
+def rows_of(store):
+    return sorted(tuple(row) for row in store.conn.execute(sa.select([store.table])))
+
+
+def test_insert_many(things_table):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    assert store.insert_many([{'name': F'n{i}', 'n': i} for i in range(25)], batch_size=10) == 25
+    assert rows_of(store) == [(i + 1, F'n{i}', i) for i in range(25)]
+
+
+def test_upsert_many(things_table):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    store.insert_many([{'id': i, 'name': F'n{i}', 'n': i} for i in range(1, 4)])
+    rows = [{'id': 2, 'name': 'two', 'n': 20}, {'id': 4, 'name': 'four', 'n': 40}, {'id': 3, 'name': 'three'}]
+    store.upsert_many(rows, batch_size=1)
+    assert rows_of(store) == [(1, 'n1', 1), (2, 'two', 20), (3, 'three', 3), (4, 'four', 40)]
+
+
+def test_upsert_odd_column_names():
+    engine = sa.create_engine('sqlite://')
+    meta = sa.MetaData()
+    table = sa.Table('odd', meta, sa.Column('id', sa.Integer, primary_key=True), sa.Column('my col', sa.String(8)))
+    meta.create_all(engine)
+    store = SimpleStore(engine.connect(), table)
+    store.upsert_many([{'id': 1, 'my col': 'a'}, {'id': 2, 'my col': 'b'}])
+    store.upsert_many([{'id': 2, 'my col': 'B'}])
+    assert rows_of(store) == [(1, 'a'), (2, 'B')]
+
+
+def test_joins_open_transaction(things_table):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    trans = conn.begin()
+    store.upsert_many([{'id': 1, 'name': 'one', 'n': 1}])
+    store.insert_many([{'id': 2, 'name': 'two', 'n': 2}])
+    assert len(rows_of(store)) == 2
+    trans.rollback()
+    assert rows_of(store) == []
+
+
+def test_update_many(things_table):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    store.insert_many([{'id': i, 'name': F'n{i}', 'n': i} for i in range(1, 4)])
+    assert store.update_many([{'id': 1, 'n': 10}, {'id': 3, 'n': 30, 'name': 'three'}, {'id': 9, 'n': 0}]) == 2
+    assert rows_of(store) == [(1, 'n1', 10), (2, 'n2', 2), (3, 'three', 30)]
+
+
+def test_benchmark(tmp_path):
+    ''' rows/sec of insert_many() vs insert() on a file-backed sqlite db '''
+    engine = sa.create_engine(F"sqlite:///{tmp_path / 'bench.db'}")
+    meta = sa.MetaData()
+    table = sa.Table('things', meta, sa.Column('id', sa.Integer, primary_key=True), sa.Column('name', sa.String(32)))
+    meta.create_all(engine)
+    store = SimpleStore(engine.connect(), table)
+
+    n_single, n_bulk = 300, 20000
+    t0 = time.time()
+    for i in range(n_single):
+        store.insert({'name': F'n{i}'})
+    single_rate = n_single / (time.time() - t0)
+
+    t0 = time.time()
+    store.insert_many({'name': F'n{i}'} for i in range(n_bulk))
+    bulk_rate = n_bulk / (time.time() - t0)
+
+    print(F"\ninsert: {single_rate:.0f} rows/sec; insert_many: {bulk_rate:.0f} rows/sec")
+    assert bulk_rate > single_rate
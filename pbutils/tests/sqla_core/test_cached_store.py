@@ -0,0 +1,60 @@
+import time
+from pbutils.sqla_core import CachedStore
+
+
+def make_store(things_table, **kwargs):
+    table, conn = things_table
+    store = CachedStore(conn, table, **kwargs)
+    store.insert_many([{'id': i, 'name': F'n{i}', 'n': i} for i in range(1, 11)])
+    return store
+
+
+def test_read_through(things_table):
+    store = make_store(things_table)
+    assert store.get_pk(3)['name'] == 'n3'
+    assert store.get_pk(3)['name'] == 'n3'
+    assert store.get_pk(99) is None
+    stats = store.row_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 1)
+
+    found = store.get_many([1, 2, 3, 42])
+    assert sorted(found) == [1, 2, 3]
+    stats = store.row_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 5, 3)
+    assert stats['mean_lookup_secs'] > 0
+
+
+def test_invalidation(things_table):
+    store = make_store(things_table)
+    store.get_many(range(1, 11))
+
+    store.update(2, {'name': 'two'})
+    assert store.get_pk(2)['name'] == 'two'
+
+    store.update_many([{'id': 3, 'name': 'three'}])
+    store.upsert_many([{'id': 4, 'name': 'four', 'n': 4}])
+    assert store.get_pk(3)['name'] == 'three'
+    assert store.get_pk(4)['name'] == 'four'
+
+    store.delete(id=5)
+    assert store.get_pk(5) is None
+    store.delete(name='n6')
+    assert store.rows.size == 0
+    assert store.get_pk(6) is None
+
+    store.clear()
+    assert store.get_many([1, 2]) == {}
+
+
+def test_lru_and_ttl(things_table):
+    store = make_store(things_table, max_size=2, ttl=0.05)
+    store.get_pk(1)
+    store.get_pk(2)
+    store.get_pk(1)             # 1 is now most recent
+    store.get_pk(3)             # evicts 2
+    assert sorted(store.rows.keys()) == [1, 3]
+
+    time.sleep(0.06)
+    misses = store.misses
+    store.get_pk(1)
+    assert store.misses == misses + 1
@@ -0,0 +1,140 @@
+import io
+import pytest
+import sqlalchemy as sa
+from pbutils import sqla_core
+from pbutils.sqla_core import split_sql, do_stream, SqlScriptError
+
+script = '''-- a dump
+SET @x = 1;
+CREATE TABLE a (id INTEGER PRIMARY KEY, s TEXT);
+/* multi-line
+   comment; with a delimiter */
+INSERT INTO a VALUES (1, 'semi;colon'), (2, 'it''s -- not a comment');
+INSERT INTO `a` VALUES (3, "dq;\\"x"); # trailing comment
+DELIMITER //
+CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END//
+DELIMITER ;
+INSERT INTO a VALUES (4, 'multi
+line;
+string');
+'''
+
+
+def test_split_sql():
+    stmts = list(split_sql(io.StringIO(script)))
+    assert [s.sql for s in stmts] == [
+        'SET @x = 1',
+        'CREATE TABLE a (id INTEGER PRIMARY KEY, s TEXT)',
+        "/* multi-line\n   comment; with a delimiter */\nINSERT INTO a VALUES (1, 'semi;colon'), (2, 'it''s -- not a comment')",
+        'INSERT INTO `a` VALUES (3, "dq;\\"x")',
+        'CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END',
+        "INSERT INTO a VALUES (4, 'multi\nline;\nstring')",
+    ]
+    assert [s.line for s in stmts] == [2, 3, 4, 7, 9, 11]
+    assert script[stmts[1].offset:].startswith('CREATE TABLE a')
+
+
+def test_split_standard_sql():
+    stmts = list(split_sql(["SELECT 'C:\\'; SELECT 1 # 2;\n"], mysql=False))
+    assert [s.sql for s in stmts] == ["SELECT 'C:\\'", 'SELECT 1 # 2']
+
+
+def test_split_mysql_dashes():
+    stmts = list(split_sql(['SELECT 1--1;\n', 'SELECT 2;-- comment\n', 'SELECT 3;--\n']))
+    assert [s.sql for s in stmts] == ['SELECT 1--1', 'SELECT 2', 'SELECT 3']
+    assert [s.sql for s in split_sql(['SELECT 1--1;\n', 'SELECT 2;\n'], mysql=False)] == ['SELECT 1\nSELECT 2']
+
+
+def test_use_replayed_per_connection(monkeypatch):
+    ''' (--databases dumps) every batch after a USE runs after that USE, on whichever connection it gets '''
+    batches = []
+    monkeypatch.setattr(sqla_core, '_run_batch',
+                        lambda conn, statements, session=(): batches.append(
+                            ([s.sql for s in session], [s.sql for s in statements])))
+    script = ['SET NAMES utf8;\n', 'USE a;\n'] + [F'INSERT INTO t{i % 3} VALUES ({i});\n' for i in range(6)] + \
+        ['USE b;\n'] + [F'INSERT INTO t{i % 3} VALUES ({i});\n' for i in range(6)]
+    engine = sa.create_engine('sqlite://')
+    with engine.connect() as conn:
+        do_stream(conn, script, transaction_size=2, workers=3)
+    assert len(batches) == 6
+    for session, statements in batches:
+        assert session[0] == 'SET NAMES utf8'
+        assert len(statements) == 2
+    assert sorted(session[-1] for session, _ in batches) == ['USE a'] * 3 + ['USE b'] * 3
+    # the USE b batches were only started after all the USE a batches:
+    assert [session[-1] for session, _ in batches[:3]] == ['USE a'] * 3
+
+
+def test_trailer_sets_not_replayed(monkeypatch):
+    ''' a mysqldump's trailing SETs (restoring the old settings) don't reach batches read before them '''
+    batches = []
+    monkeypatch.setattr(sqla_core, '_run_batch',
+                        lambda conn, statements, session=(): batches.append(
+                            ([s.sql for s in session], [s.sql for s in statements])))
+    header = [
+        '/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n',
+        '/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;\n',
+        "/*!40103 SET TIME_ZONE='+00:00' */;\n",
+        '/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n',
+    ]
+    trailer = [
+        '/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;\n',
+        '/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n',
+        '/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;\n',
+    ]
+    inserts = [F'INSERT INTO t{i % 3} VALUES ({i});\n' for i in range(7)]
+    engine = sa.create_engine('sqlite://')
+    with engine.connect() as conn:
+        do_stream(conn, header + inserts + trailer, transaction_size=2, workers=3)
+    assert sorted(sql for _, statements in batches for sql in statements) == sorted(s.rstrip(';\n') for s in inserts)
+    for session, _ in batches:
+        assert len(session) == len(header)
+        assert not any('@OLD' in sql and '@@' not in sql for sql in session)
+
+
+def make_script(n_tables, n_rows):
+    lines = []
+    for t in range(n_tables):
+        lines.append(F'CREATE TABLE t{t} (id INTEGER PRIMARY KEY, s TEXT);\n')
+        lines.extend(F"INSERT INTO t{t} VALUES ({i}, 'row; {i}:x %s');\n" for i in range(n_rows))
+    lines.append('CREATE VIEW v AS SELECT * FROM t0;\n')
+    return lines
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_do_stream(tmp_path, workers):
+    engine = sa.create_engine(F"sqlite:///{tmp_path / 'script.db'}")
+    with engine.connect() as conn:
+        stats = do_stream(conn, make_script(4, 50), transaction_size=20, workers=workers)
+        assert stats.n_statements == 4 * 51 + 1
+        assert stats.n_transactions == 4 * 3 + 1 if workers > 1 else 11
+        assert stats.statements_per_sec > 0
+        for t in range(4):
+            assert conn.execute(sa.text(F'SELECT count(*) FROM t{t}')).scalar() == 50
+        assert conn.execute(sa.text('SELECT s FROM v WHERE id=7')).scalar() == 'row; 7:x %s'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failure_location(tmp_path, workers):
+    engine = sa.create_engine(F"sqlite:///{tmp_path / 'fail.db'}")
+    lines = make_script(2, 5)
+    lines[4] = 'INSERT INTO t0 VALUES (1, "dup");\n'
+    with engine.connect() as conn:
+        with pytest.raises(SqlScriptError) as e:
+            do_stream(conn, lines, transaction_size=3, workers=workers)
+        assert (e.value.statement.line, e.value.statement.sql) == (5, 'INSERT INTO t0 VALUES (1, "dup")')
+        assert 'line 5' in str(e.value)
+        # the failing transaction was rolled back, the one before it committed:
+        assert conn.execute(sa.text('SELECT count(*) FROM t0')).scalar() == 2
+
+
+def test_joins_open_transaction():
+    engine = sa.create_engine('sqlite://')
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(sa.text('CREATE TABLE t (id INTEGER PRIMARY KEY)'))
+        trans = conn.begin()
+        do_stream(conn, [F'INSERT INTO t VALUES ({i});\n' for i in range(5)], transaction_size=2)
+        assert conn.execute(sa.text('SELECT count(*) FROM t')).scalar() == 5
+        trans.rollback()
+        assert conn.execute(sa.text('SELECT count(*) FROM t')).scalar() == 0
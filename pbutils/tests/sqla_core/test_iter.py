@@ -0,0 +1,36 @@
+from pbutils.sqla_core import SimpleStore
+
+
+def make_store(things_table, n_rows=25):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    store.insert_many([{'id': i, 'name': F'n{i % 3}', 'n': i} for i in range(1, n_rows + 1)])
+    return store
+
+
+def test_iter_keyset(things_table):
+    store = make_store(things_table)
+    rows = list(store.iter(batch_size=7))
+    assert [row['id'] for row in rows] == list(range(1, 26))
+    assert rows[0] == {'id': 1, 'name': 'n1', 'n': 1}
+
+    rows = list(store.iter({'name': 'n0'}, batch_size=2, as_dict=False))
+    assert rows == [(i, 'n0', i) for i in range(3, 26, 3)]
+
+
+def test_iter_keyset_exact_multiple(things_table):
+    store = make_store(things_table, n_rows=10)
+    assert len(list(store.iter(batch_size=5))) == 10
+
+
+def test_iter_streamed(things_table):
+    store = make_store(things_table)
+    rows = list(store.iter(batch_size=4, order_by_pk=False, as_dict=False))
+    assert sorted(rows) == [(i, F'n{i % 3}', i) for i in range(1, 26)]
+
+
+def test_get_many(things_table):
+    store = make_store(things_table)
+    found = store.get_many([3, 5, 99, 20], batch_size=2)
+    assert sorted(found) == [3, 5, 20]
+    assert found[5]['name'] == 'n2'
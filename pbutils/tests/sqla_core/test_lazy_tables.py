@@ -0,0 +1,120 @@
+import re
+import pytest
+from contextlib import contextmanager
+import sqlalchemy as sa
+from pbutils.sqla_core import import_tables, table_by_name, LazyTables, schema_fingerprint
+
+
+def make_db(path, n_tables=5):
+    engine = sa.create_engine(F"sqlite:///{path}")
+    meta = sa.MetaData()
+    sa.Table('parent', meta, sa.Column('id', sa.Integer, primary_key=True))
+    for t in range(n_tables):
+        sa.Table(F't{t}', meta,
+                 sa.Column('id', sa.Integer, primary_key=True),
+                 sa.Column('parent_id', sa.Integer, sa.ForeignKey('parent.id')),
+                 sa.Column('name', sa.String(20)))
+    meta.create_all(engine)
+    return engine
+
+
+def test_lazy(tmp_path):
+    engine = make_db(tmp_path / 'lazy.db')
+    meta = sa.MetaData()
+    tables = import_tables(engine, meta, lazy=True)
+    assert isinstance(tables, LazyTables)
+    assert sorted(tables) == ['parent', 't0', 't1', 't2', 't3', 't4']
+    assert not meta.tables
+
+    t2 = table_by_name(meta, 't2')
+    assert [col.name for col in t2.c] == ['id', 'parent_id', 'name']
+    assert sorted(meta.tables) == ['parent', 't2']     # and its foreign key target
+    assert table_by_name(meta, 'nope') is None
+    assert 'nope' not in tables
+
+
+def test_cache(tmp_path):
+    engine = make_db(tmp_path / 'cached.db')
+    cache_path = tmp_path / 'tables.pickle'
+
+    tables = import_tables(engine, sa.MetaData(), cache_path=cache_path)
+    assert len(tables.meta.tables) == 6
+    assert cache_path.exists()
+
+    reflected = []
+
+    def on_reflect(inspector, table, column):
+        reflected.append(table.name)
+    sa.event.listen(sa.Table, 'column_reflect', on_reflect)
+    try:
+        check_cached(engine, cache_path, reflected)
+    finally:
+        sa.event.remove(sa.Table, 'column_reflect', on_reflect)
+
+
+def check_cached(engine, cache_path, reflected):
+    meta = sa.MetaData()
+    tables = import_tables(engine, meta, cache_path=cache_path)
+    assert sorted(meta.tables) == ['parent', 't0', 't1', 't2', 't3', 't4']
+    assert reflected == []
+    t1 = table_by_name(meta, 't1')
+    assert list(t1.foreign_keys)[0].column is meta.tables['parent'].c.id
+    with engine.connect() as conn:
+        conn.execute(t1.insert(), {'id': 1, 'name': 'x'})
+        assert conn.execute(sa.select([t1.c.name])).scalar() == 'x'
+
+    # a lazy lookup from the cache brings in foreign key targets, as reflection does:
+    meta = sa.MetaData()
+    t4 = import_tables(engine, meta, lazy=True, cache_path=cache_path)['t4']
+    assert sorted(meta.tables) == ['parent', 't4']
+    assert list(t4.foreign_keys)[0].column is meta.tables['parent'].c.id
+    assert reflected == []
+
+    # a schema change invalidates the cache:
+    fingerprint = schema_fingerprint(engine)
+    with engine.connect() as conn:
+        conn.execute(sa.text('ALTER TABLE t3 ADD COLUMN extra INTEGER'))
+    assert schema_fingerprint(engine) != fingerprint
+    meta = sa.MetaData()
+    tables = import_tables(engine, meta, lazy=True, cache_path=cache_path)
+    assert 'extra' in tables['t3'].c
+    assert 't3' in reflected
+
+    # and so does an index change:
+    tables['t2']                # cached under the new fingerprint
+    reflected.clear()
+    import_tables(engine, sa.MetaData(), lazy=True, cache_path=cache_path)['t2']
+    assert reflected == []
+    fingerprint = schema_fingerprint(engine)
+    with engine.connect() as conn:
+        conn.execute(sa.text('CREATE INDEX ix_t2_name ON t2 (name)'))
+    assert schema_fingerprint(engine) != fingerprint
+    tables = import_tables(engine, sa.MetaData(), lazy=True, cache_path=cache_path)
+    assert [ix.name for ix in tables['t2'].indexes] == ['ix_t2_name']
+    assert 't2' in reflected
+
+
+class FakeEngine:
+    ''' answers catalog queries from catalogs (k=catalog name, v=rows) '''
+    def __init__(self, dialect_name, catalogs):
+        self.dialect = type('Dialect', (), {'name': dialect_name})
+        self.catalogs = catalogs
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+    def execute(self, clause):
+        catalog = re.search(r'FROM\s+(?:information_schema\.)?(\w+)', str(clause)).group(1)
+        return self.catalogs.get(catalog, [])
+
+
+@pytest.mark.parametrize('dialect_name, index_catalog', [('mysql', 'statistics'), ('postgresql', 'pg_indexes')])
+def test_fingerprint_keys_and_indexes(dialect_name, index_catalog):
+    catalogs = {'columns': [('t', 'id', 'int')]}
+    engine = FakeEngine(dialect_name, catalogs)
+    fingerprints = {schema_fingerprint(engine)}
+    for catalog in ('table_constraints', 'key_column_usage', index_catalog):
+        catalogs[catalog] = [('t', F'{catalog}_1')]
+        fingerprints.add(schema_fingerprint(engine))
+    assert len(fingerprints) == 4
@@ -0,0 +1,39 @@
+from pbutils.sqla_core import SimpleStore
+
+
+def test_crud_uses_cache(things_table):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    for i in range(1, 6):
+        assert store.insert({'id': i, 'name': F'n{i % 2}', 'n': i}) == i
+    assert store.cache_stats()['misses'] == 1
+
+    assert store.get_pk(3)['name'] == 'n1'
+    assert store.get_pk(99) is None
+    assert sorted(row['id'] for row in store.get(name='n1')) == [1, 3, 5]
+    assert [row['id'] for row in store.get(name='n1', n=3)] == [3]
+    assert [row['id'] for row in store.get(n=3, name='n1')] == [3]
+
+    store.update(2, {'name': 'two', 'n': 20})
+    store.update(4, {'n': 40, 'name': 'four'})
+    assert store.get_pk(2)['name'] == 'two'
+    assert store.get_pk(4)['n'] == 40
+
+    store.delete(name='n1')
+    store.delete(name='two')
+    assert [row['id'] for row in store.get()] == [4]
+
+    stats = store.cache_stats()
+    # insert, get_pk, get(name), get(name, n), update(n, name), delete(name), get():
+    assert stats['statements'] == stats['misses'] == 7
+    assert stats['hits'] == 10
+    assert stats['compiled'] == 7
+
+
+def test_outer_transaction_respected(things_table):
+    table, conn = things_table
+    store = SimpleStore(conn, table)
+    trans = conn.begin()
+    store.insert({'id': 1, 'name': 'a', 'n': 1})
+    trans.rollback()
+    assert store.get_pk(1) is None
@@ -0,0 +1,92 @@
+import time
+import random
+import pytest
+
+from pbutils import tags
+from pbutils.tags import TagIndex, intersect
+
+
+BIKES = [
+    {'brand': 'honda', 'year': 1988, 'model': 'nt650', 'name': 'hawk', 'color': 'grey'},
+    {'brand': 'triumph', 'year': 2006, 'model': 'daytona', 'color': 'gold'},
+    {'brand': 'ktm', 'year': 2015, 'model': '690 enduro', 'color': 'orange'},
+    {'brand': 'ktm', 'year': 2019, 'model': '790 duke', 'color': 'black'},
+    {'brand': 'husqvarna', 'year': 2019, 'model': '701', 'color': 'orange'},
+    {'brand': 'honda', 'year': 1988, 'model': 'vfr750', 'color': 'red'},
+]
+
+
+@pytest.fixture
+def bikes(tmp_path):
+    tags.init(F"sqlite:///{tmp_path / 'tags.db'}")
+    bikes = BIKES
+    oids = [tags.insert_obj(**bike) for bike in bikes]
+    yield dict(zip(oids, bikes))
+    tags.db.dispose()
+
+
+def expected(bikes, **terms):
+    return {oid for oid, bike in bikes.items() if all(str(bike.get(k)) == str(v) for k, v in terms.items())}
+
+
+@pytest.mark.parametrize('terms', [
+    {'color': 'orange'},
+    {'color': 'orange', 'brand': 'ktm'},
+    {'brand': 'honda', 'year': 1988},
+    {'brand': 'honda', 'color': 'no such color'},
+    {'nope': 'x'},
+])
+def test_search(bikes, terms):
+    want = expected(bikes, **terms)
+    assert tags.search(**terms) == want
+    assert tags.search_cached(**terms) == want
+
+
+def test_index_invalidation(bikes):
+    assert tags.search_cached(color='purple') == set()
+    oid = tags.insert_obj(color='purple', brand='ktm')
+    assert tags.search_cached(color='purple') == {oid}
+    tags.add_tags(oid, year=2020)
+    assert tags.search_cached(brand='ktm', year=2020) == {oid}
+    tags.remove_object(oid)
+    assert tags.search_cached(color='purple') == set()
+    with pytest.raises(ValueError):
+        tags.search()
+
+
+def test_intersect_without_numpy(monkeypatch):
+    from array import array
+    monkeypatch.setattr(tags, 'HAS_NUMPY', False)
+    postings = [array('q', range(0, 100, 2)), array('q', range(0, 100, 3)), array('q', [6, 7, 12, 99])]
+    assert list(intersect(postings)) == [6, 12]
+    assert list(intersect([array('q'), array('q', [1])])) == []
+
+
+def test_benchmark(tmp_path):
+    ''' GROUP BY/HAVING search vs the in-memory index, on 200k tag rows '''
+    tags.init(F"sqlite:///{tmp_path / 'bench.db'}")
+    rng = random.Random(42)
+    n_objs = 50000
+    rows = [{'oid': oid, 'key': key, 'value': str(rng.randrange(n_values))}
+            for oid in range(n_objs)
+            for key, n_values in (('a', 2), ('b', 10), ('c', 100), ('d', 1000))]
+    with tags.db.begin() as conn:
+        conn.execute(tags.sa.text("INSERT INTO tags (oid, key, value) VALUES (:oid, :key, :value)"), rows)
+    terms = {'a': '1', 'b': '3', 'c': '7'}
+
+    t0 = time.time()
+    found = tags.search(**terms)
+    sql_secs = time.time() - t0
+    index = TagIndex(tags.db)
+    t0 = time.time()
+    assert index.search(**terms) == found
+    cold_secs = time.time() - t0
+    t0 = time.time()
+    assert index.search(**terms) == found
+    warm_secs = time.time() - t0
+    print(F"\nsearch: {sql_secs * 1000:.1f}ms, index cold: {cold_secs * 1000:.1f}ms, warm: {warm_secs * 1000:.2f}ms")
+    assert found == {row['oid'] for row in rows if row['key'] == 'c' and row['value'] == '7'} & \
+        {row['oid'] for row in rows if row['key'] == 'b' and row['value'] == '3'} & \
+        {row['oid'] for row in rows if row['key'] == 'a' and row['value'] == '1'}
+    assert warm_secs < sql_secs
+    tags.db.dispose()
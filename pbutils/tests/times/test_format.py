@@ -0,0 +1,31 @@
+import pytest
+from pbutils.times import duration, durations, ep2asc, ep2asc_many, EpochFormatter, HAS_NUMPY
+
+epochs = [0, 1521315262.7, 1521315262.2, 1600000000, 1521315262]
+
+
+def test_durations():
+    values = [2, 67, 3724, 86406, 67, 31536000 + 20]
+    assert durations(values) == [duration(v) for v in values]
+
+
+@pytest.mark.parametrize('fmt', [None, '%Y-%m-%d %H:%M:%S', '%y%m%d {%j} %%', '%a %b %d %Y'])
+@pytest.mark.parametrize('gmt', [True, False])
+def test_ep2asc_many(fmt, gmt):
+    assert ep2asc_many(epochs, gmt=gmt, fmt=fmt) == [ep2asc(e, gmt=gmt, fmt=fmt) for e in epochs]
+
+
+def test_formatter_cache():
+    formatter = EpochFormatter('%H:%M:%S', gmt=True)
+    assert formatter.template is not None
+    formatter.format_many(epochs)
+    assert formatter.cache_info().hits == 2
+    assert EpochFormatter('%b %d').template is None
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason='numpy not installed')
+def test_numpy_input():
+    import numpy as np
+    arr = np.array(epochs)
+    assert ep2asc_many(arr, gmt=True) == [ep2asc(e, gmt=True) for e in epochs]
+    assert durations(np.array([2, 67, 2])) == [duration(v) for v in [2, 67, 2]]
@@ -0,0 +1,46 @@
+import math
+from time import strptime, mktime
+import pytest
+from pbutils.times import parse_std, parse_many, TimeParser, HAS_NUMPY
+
+
+@pytest.mark.parametrize('timestr, fmt', [
+    ('2018-03-17', '%Y-%m-%d'),
+    ('2018/3/7', '%Y/%m/%d'),
+    ('2018 03 17 19:34:22', '%Y %m %d %H:%M:%S'),
+    ('18-03-17', '%y-%m-%d'),
+    ('03/17/2018 19:34:22', '%m/%d/%Y %H:%M:%S'),
+])
+def test_parse_std(timestr, fmt):
+    assert parse_std(timestr) == strptime(timestr, fmt)
+    assert TimeParser().parse(timestr) == strptime(timestr, fmt)
+
+
+def test_parse_std_fails():
+    assert parse_std('not a time') is None
+    assert parse_std('2018-13-45') is None
+    assert parse_std('2018-03-17\n') is None
+    assert TimeParser().parse('2018-03-17 01:02:03\n') is None
+
+
+def test_remembers_format():
+    parser = TimeParser()
+    parser.parse('03/17/18 01:02:03')
+    assert parser.last_fmt == '%m/%d/%y %H:%M:%S'
+    assert parser.parse('04/18/19 01:02:03') == strptime('04/18/19 01:02:03', '%m/%d/%y %H:%M:%S')
+
+
+def test_parse_many():
+    epochs = parse_many(['2018-03-17 19:34:22', 'garbage', '03/17/2018'])
+    assert epochs[0] == mktime(strptime('2018-03-17 19:34:22', '%Y-%m-%d %H:%M:%S'))
+    assert math.isnan(epochs[1])
+    assert epochs[2] == mktime(strptime('2018-03-17', '%Y-%m-%d'))
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason='numpy not installed')
+def test_parse_many_numpy():
+    import numpy as np
+    arr = parse_many(['2018-03-17 19:34:22', 'garbage'], as_numpy=True)
+    assert arr.dtype == np.dtype('datetime64[s]')
+    assert arr[0].astype('int64') == int(mktime(strptime('2018-03-17 19:34:22', '%Y-%m-%d %H:%M:%S')))
+    assert np.isnat(arr[1])
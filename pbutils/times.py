@@ -1,4 +1,13 @@
+import re
+import math
+from datetime import datetime
+from functools import lru_cache
 from time import localtime, asctime, gmtime, strftime, time, strptime, mktime
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 
 def duration(t):
@@ -46,9 +55,95 @@ def ep2asc(seconds=None, gmt=False, fmt=None):
         return asctime(f(seconds))
 
 
+_cached_duration = lru_cache(maxsize=1 << 16)(duration)
+
+
+def durations(seconds):
+    ''' batch version of duration(): seconds is a sequence or numpy array; returns a list of strings '''
+    return _map_unique(_cached_duration, seconds)
+
+
+# strftime directives EpochFormatter can render with str.format; {0} is a struct_time, {1} is the 2-digit year:
+_strftime_fields = {
+    'Y': '{0.tm_year}',
+    'y': '{1:02d}',
+    'm': '{0.tm_mon:02d}',
+    'd': '{0.tm_mday:02d}',
+    'H': '{0.tm_hour:02d}',
+    'M': '{0.tm_min:02d}',
+    'S': '{0.tm_sec:02d}',
+    'j': '{0.tm_yday:03d}',
+    '%': '%',
+}
+
+
+def _compile_strftime(fmt):
+    ''' translate fmt to a str.format template, or return None if fmt has locale-dependent directives '''
+    parts = re.split(r'(%.)', fmt)
+    template = []
+    for part in parts:
+        if part.startswith('%') and len(part) == 2:
+            field = _strftime_fields.get(part[1])
+            if field is None:
+                return None
+            template.append(field)
+        else:
+            template.append(part.replace('{', '{{').replace('}', '}}'))
+    return ''.join(template)
+
+
+class EpochFormatter:
+    '''
+    Precompiled, cached equivalent of ep2asc(seconds, gmt, fmt), for formatting many timestamps.
+
+    Formatted strings are cached per whole second.  Formats made only of numeric directives
+    (%Y %y %m %d %H %M %S %j) are rendered with str.format instead of strftime.
+    '''
+    def __init__(self, fmt=None, gmt=False, cache_size=1 << 16):
+        self.fmt = fmt
+        self.gmt = gmt
+        self.template = _compile_strftime(fmt) if fmt else None
+        self._format = lru_cache(maxsize=cache_size)(self._format_second)
+
+    def _format_second(self, second):
+        t = gmtime(second) if self.gmt else localtime(second)
+        if self.template is not None:
+            return self.template.format(t, t.tm_year % 100)
+        if self.fmt:
+            return strftime(self.fmt, t)
+        return asctime(t)
+
+    def __call__(self, seconds):
+        return self._format(math.floor(seconds))
+
+    def format_many(self, seconds):
+        ''' seconds: a sequence or numpy array of epoch times; returns a list of strings '''
+        return _map_unique(self, seconds)
+
+    def cache_info(self):
+        return self._format.cache_info()
+
+
+def ep2asc_many(seconds, gmt=False, fmt=None):
+    ''' batch version of ep2asc(): seconds is a sequence or numpy array; returns a list of strings '''
+    return EpochFormatter(fmt=fmt, gmt=gmt).format_many(seconds)
+
+
+def _map_unique(f, values):
+    ''' return [f(v) for v in values]; numpy arrays only call f once per distinct value '''
+    if HAS_NUMPY and isinstance(values, np.ndarray):
+        uniques, inverse = np.unique(values, return_inverse=True)
+        formatted = np.array([f(v) for v in uniques.tolist()], dtype=object)
+        return formatted[inverse.ravel()].tolist()
+    return [f(v) for v in values]
+
+
 def parse_std(timestr):
     ''' try to parse timestr according to common formats; return time.struct_time if ok, else None '''
-    for fmt in __formats:
+    t = _parse_iso(timestr)
+    if t is not None:
+        return t
+    for fmt in _formats:
         try:
             return strptime(timestr, fmt)
         except ValueError:
@@ -56,7 +151,87 @@ def parse_std(timestr):
     return None
 
 
-__formats = [
+# matches the '%Y?%m?%d' and '%Y?%m?%d %H:%M:%S' formats below, where '?' is one of '-', '/', ' ':
+_iso_re = re.compile(r'(\d{4})([-/ ])(\d{1,2})\2(\d{1,2})(?: (\d{1,2}):(\d{1,2}):(\d{1,2}))?\Z')
+
+
+def _parse_iso(timestr):
+    ''' fast path for 4-digit-year formats; returns time.struct_time, or None to fall back to strptime '''
+    mg = _iso_re.match(timestr)
+    if mg is None:
+        return None
+    year, _, month, day, hour, minute, sec = mg.groups()
+    try:
+        return datetime(int(year), int(month), int(day),
+                        int(hour or 0), int(minute or 0), int(sec or 0)).timetuple()
+    except ValueError:
+        return None
+
+
+class TimeParser:
+    '''
+    Parse timestamps from a single stream (eg, a log file).
+
+    Like parse_std(), but remembers the last format that worked and tries it first,
+    so a stream of consistently formatted timestamps costs one strptime() per line
+    instead of one per candidate format.  Note that for ambiguous strings (eg '03-04-05')
+    the remembered format wins over the order of the formats list.
+    '''
+    def __init__(self, formats=None):
+        self.formats = list(formats) if formats is not None else list(_formats)
+        self.last_fmt = None
+
+    def parse(self, timestr):
+        ''' return time.struct_time if timestr can be parsed, else None '''
+        t = _parse_iso(timestr)
+        if t is not None:
+            return t
+
+        if self.last_fmt is not None:
+            try:
+                return strptime(timestr, self.last_fmt)
+            except ValueError:
+                pass
+
+        for fmt in self.formats:
+            if fmt == self.last_fmt:
+                continue
+            try:
+                t = strptime(timestr, fmt)
+            except ValueError:
+                continue
+            self.last_fmt = fmt
+            return t
+        return None
+
+    def parse_epoch(self, timestr):
+        ''' return seconds since the epoch (local time) as a float, or NaN if timestr can't be parsed '''
+        t = self.parse(timestr)
+        return mktime(t) if t is not None else float('nan')
+
+    def parse_many(self, strings, as_numpy=False):
+        '''
+        Parse all strings; return a list of epoch floats (NaN for failures).
+        If as_numpy is True, return a numpy datetime64[s] array instead (NaT for failures).
+        '''
+        epochs = [self.parse_epoch(timestr) for timestr in strings]
+        if not as_numpy:
+            return epochs
+        if not HAS_NUMPY:
+            raise RuntimeError("numpy not installed")
+        arr = np.array(epochs, dtype=float)
+        answer = np.full(len(arr), np.datetime64('NaT'), dtype='datetime64[s]')
+        ok = ~np.isnan(arr)
+        answer[ok] = arr[ok].astype('int64').astype('datetime64[s]')
+        return answer
+
+
+def parse_many(strings, as_numpy=False):
+    ''' parse a sequence of time strings that share a format; see TimeParser.parse_many() '''
+    return TimeParser().parse_many(strings, as_numpy=as_numpy)
+
+
+_formats = [
     '%Y-%m-%d',
     '%Y/%m/%d',
     '%Y %m %d',